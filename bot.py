@@ -1,30 +1,480 @@
+from __future__ import annotations
+
+import argparse
+import atexit
+import base64
+import csv
+import gzip
+import hashlib
+import hmac
+import importlib
 import json
 import logging
 import os
+import pickle
+import queue
+import re
+import socket
+import statistics
+import sqlite3
+import sys
 import threading
 import time
+import tracemalloc
+import urllib.parse
+import urllib.request
+import uuid
+import zlib
+from collections import deque
+from contextlib import contextmanager
+from enum import Enum
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import permutations
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from tkinter import Tk, Label, Entry, Button, Checkbutton, IntVar, messagebox, filedialog, StringVar
+from typing import TYPE_CHECKING
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Запуск: окно показывается до импорта selenium и gspread, они грузятся в фоне
+PROCESS_STARTED = time.perf_counter()
+# событие запуска -> (начало, длительность) в секундах от начала работы скрипта
+startup_timings: dict = {}
+eager_imports: list = []
+
+
+class LazyImport:
+    """Модуль или объект модуля, который импортируется при первом обращении."""
+
+    def __init__(self, module: str, attribute: str | None = None) -> None:
+        self.module = module
+        self.attribute = attribute
+        self.target = None
+
+    def load(self):
+        if self.target is None:
+            fresh = self.module not in sys.modules
+            started = time.perf_counter()
+            module = importlib.import_module(self.module)
+            if fresh:
+                startup_timings.setdefault(self.module, (started - PROCESS_STARTED, time.perf_counter() - started))
+            self.target = getattr(module, self.attribute) if self.attribute else module
+        return self.target
+
+    def __getattr__(self, name: str):
+        return getattr(self.load(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+
+if TYPE_CHECKING:
+    # здесь тяжелые зависимости видны проверке типов и сборщику exe, а при запуске они грузятся лениво
+    import gspread
+    from google.auth.transport import requests as google_requests
+    from selenium import webdriver
+    from selenium.common import exceptions as selenium_exceptions
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.webdriver import WebDriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait, Select
+else:
+    gspread = LazyImport("gspread")
+    google_requests = LazyImport("google.auth.transport.requests")
+    webdriver = LazyImport("selenium.webdriver")
+    selenium_exceptions = LazyImport("selenium.common.exceptions")
+    Service = LazyImport("selenium.webdriver.chrome.service", "Service")
+    WebDriver = LazyImport("selenium.webdriver.chrome.webdriver", "WebDriver")
+    By = LazyImport("selenium.webdriver.common.by", "By")
+    EC = LazyImport("selenium.webdriver.support.expected_conditions")
+    WebDriverWait = LazyImport("selenium.webdriver.support.ui", "WebDriverWait")
+    Select = LazyImport("selenium.webdriver.support.ui", "Select")
+
+HEAVY_IMPORTS = [gspread, google_requests, webdriver, selenium_exceptions, Service, WebDriver, By, EC, WebDriverWait, Select]
+
+# Журнал: текст в консоль и строки JSON в файл с ротацией
+LOG_FORMAT = "%(levelname)s - %(threadName)s - %(lineno)d - %(message)s"
+LOG_FILE = os.path.join("logs", "bot.jsonl")
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+
+logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+
+SITE_URL = "https://kiber-one.club/"
+CREDENTIALS_FILE = "credentials.json"
+SETTINGS_FILE = "settings.json"
+PROFILES_DIR = "profiles"
+SHEET_CACHE_DIR = ".sheet_cache"
+TARGETS_FILE = "targets.json"
+COSTS_FILE = "action_costs.json"
+
+# Столбцы файлов истории начислений
+HISTORY_COLUMNS = ["time", "club", "worksheet", "student", "column", "kind", "value"]
+
+# Что затирается в записи сайта помимо логина, пароля и ФИО
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+PHONE_PATTERN = re.compile(r"\+?[78][\s(-]*\d{3}[\s)-]*\d{3}[\s-]*\d{2}[\s-]*\d{2}")
+DATE_PATTERN = re.compile(r"(?<!\d)\d{2}\.\d{2}\.(?:19|20)\d{2}(?!\d)")
+
+# Значения по умолчанию; любое из них можно переопределить в settings.json
+DEFAULT_SETTINGS = {
+    "driver_max_actions": 300,
+    "driver_max_rss_mb": 1500,
+    "driver_latency_factor": 2.0,
+    "watch_interval": 30,
+    "stream_min_rows": 2000,
+    "stream_chunk_rows": 200,
+    "aimd_max_limit": 4,
+    "aimd_decrease": 0.5,
+    "aimd_slow_seconds": 15,
+    "student_failure_limit": 2,
+    "site_failure_limit": 5,
+    "site_pause_seconds": 60,
+    "site_max_pauses": 3,
+    "retry_attempts": 2,
+    "retry_delay_seconds": 5,
+    "name_match_threshold": 0.5,
+    "name_match_margin": 0.1,
+    "max_browsers": 3,
+    "sheets_requests_per_minute": 60,
+    "task_queue": "",
+    "task_queue_token": "",
+    "task_lease_seconds": 300,
+    "task_poll_seconds": 5,
+    "task_max_attempts": 3,
+    "history_dir": "history",
+    "history_flush_rows": 50,
+    "site_url": SITE_URL,
+    "record_dir": "",
+    "network_timing": False,
+    "memory_every_students": 0,
+    "command_budgets": {},
+    "warm_up_sheets": True,
+    "balance_selector": "",
+    "award_amounts": {"конкурсы-активность": 5},
+    "confirm_awards": True,
+    "deadline": "",
+    "time_budget_minutes": 0,
+    "priority_columns": ["оплата", "др"],
+    "award_values": {},
+}
+
+LATENCY_WINDOW = 10
+
+# Оценка шага начисления, пока нет данных прошлых запусков, и вес нового замера в среднем
+DEFAULT_STEP_SECONDS = 10.0
+COST_SMOOTHING = 0.2
+
+# Панель запуска в окне: период обновления, окно расчета скорости и число замеров шага в графике
+DASHBOARD_REFRESH_MS = 1000
+RATE_WINDOW_SECONDS = 120
+STEP_SAMPLES = 40
+
+# Слова ФИО короче этого сравниваются без опечаток
+FUZZY_WORD_MIN = 5
+
+# Сколько самых медленных адресов сайта попадает в отчет сетевых замеров
+NETWORK_TOP_ENDPOINTS = 10
+
+# Телеметрия памяти бота: глубина стека у выделений и сколько самых выросших мест попадает в профиль
+MEMORY_TRACE_FRAMES = 5
+MEMORY_TOP_SITES = 10
+
+# Столбцы таблицы в порядке обработки: вид начисления и индекс причины на сайте
+AWARD_RULES = [
+    {"column": "конкурсы-активность", "kind": "activity", "cause": 1, "label": "киберонов"},
+    {"column": "посещение", "kind": "bonus", "cause": 16, "label": "за посещение"},
+    {"column": "быстрота", "kind": "bonus", "cause": 1, "label": "за быстроту"},
+    {"column": "помощьдругу", "kind": "bonus", "cause": 4, "label": "за помощь другу"},
+    {"column": "разминка", "kind": "bonus", "cause": 8, "label": "за разминку"},
+    {"column": "оплата", "kind": "bonus", "cause": 15, "label": "за оплату"},
+    {"column": "штраф", "kind": "penalty", "cause": None, "label": "штрафа"},
+    {"column": "дз", "kind": "bonus", "cause": 10, "label": "за ДЗ"},
+    {"column": "др", "kind": "bonus", "cause": 14, "label": "за ДР"},
+    {"column": "бонус пропуск", "kind": "bonus", "cause": 5, "label": "бонуса за модуль без пропуска"},
+    {"column": "бонус поведение", "kind": "bonus", "cause": 2, "label": "бонуса за модуль без замечаний по поведению"},
+]
+
+RULES_BY_COLUMN = {rule["column"]: rule for rule in AWARD_RULES}
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+# Состояние клиентского фильтра списка пользователей: null, пока фильтр не применен,
+# иначе видимые строки вместе с текстом ссылки на профиль
+SEARCH_STATE_SCRIPT = """
+var rows = document.querySelectorAll('div.user_item');
+var filtered = false, shown = [];
+for (var i = 0; i < rows.length; i++) {
+    if (rows[i].style.display) { filtered = true; }
+    if (rows[i].style.display === 'table-row') {
+        var link = rows[i].querySelector('a');
+        shown.push([rows[i], link ? link.textContent : rows[i].textContent]);
+    }
+}
+return filtered ? shown : null;
+"""
+
+# ФИО всех пользователей из списка на сайте (текст ссылки на профиль)
+USER_NAMES_SCRIPT = """
+var names = [];
+document.querySelectorAll('div.user_item').forEach(function (row) {
+    var link = row.querySelector('a');
+    names.push(link ? link.textContent : row.textContent);
+});
+return names;
+"""
+
+# ФИО и текст баланса каждого пользователя из списка; arguments[0] - селектор баланса внутри строки
+USER_BALANCES_SCRIPT = """
+var selector = arguments[0], balances = [];
+document.querySelectorAll('div.user_item').forEach(function (row) {
+    var link = row.querySelector('a'), balance = row.querySelector(selector);
+    balances.push([link ? link.href : null, link ? link.textContent : row.textContent, balance ? balance.textContent : null]);
+});
+return balances;
+"""
+
+# Пункты списка формы начисления: пары [value, текст]
+SELECT_OPTIONS_SCRIPT = """
+return Array.from(arguments[0].options).map(function (option) {
+    return [option.value, option.text.trim()];
+});
+"""
+
+# Выбор пункта списка по value с теми же событиями, что и при выборе мышью
+SET_SELECT_SCRIPT = """
+var select = arguments[0];
+select.value = arguments[1];
+select.dispatchEvent(new Event('input', {bubbles: true}));
+select.dispatchEvent(new Event('change', {bubbles: true}));
+return select.value === arguments[1];
+"""
+
+# Разметка сообщений об ошибке валидации в модальном окне начисления
+MODAL_ERROR_SELECTOR = ".uss_modal .error, .uss_modal .has-error, .uss_modal .alert-danger, .uss_modal .invalid-feedback"
+
+
+class StepResult(Enum):
+    """Итог шага работы с сайтом."""
+
+    OK = "ok"
+    NOT_FOUND = "not_found"
+    AMBIGUOUS = "ambiguous"
+    REJECTED = "rejected"
+    TIMEOUT = "timeout"
+    # форма отправлена, но сайт не подтвердил начисление: повтор может начислить дважды
+    UNCONFIRMED = "unconfirmed"
+
+
+def is_blank(value) -> bool:
+    """Пустая ячейка: None или строка из одних пробелов."""
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+class SheetRow:
+    """Легкое представление одной строки SheetTable без копирования значений."""
+
+    __slots__ = ("table", "position")
+
+    def __init__(self, table: "SheetTable", position: int) -> None:
+        self.table = table
+        self.position = position
+
+    @property
+    def index(self) -> int:
+        return self.table.index[self.position]
+
+    def __getitem__(self, column: str):
+        return self.table.data[self.table.positions[column]][self.position]
+
+    def get(self, column: str, default=None):
+        if column not in self.table.positions:
+            return default
+        return self[column]
+
+
+class SheetTable:
+    """Данные листа по столбцам с битовой картой измененных ячеек.
+
+    Номера измененных битов хранятся и списком, поэтому запись изменений
+    стоит по числу измененных ячеек, а не по размеру листа.
+
+    Индексы строк считаются от первой строки данных (строка 2 листа),
+    как у get_all_records.
+    """
 
-import gspread
-import pandas as pd
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.webdriver import WebDriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait, Select
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(levelname)s - %(lineno)d - %(message)s'
-)
+    __slots__ = ("columns", "positions", "data", "index", "dirty", "changed")
+
+    def __init__(self, columns: list, rows: list, first_index: int = 0) -> None:
+        self.columns = list(columns)
+        self.positions = {column: position for position, column in enumerate(self.columns)}
+        self.data = [
+            [row[position] if position < len(row) else "" for row in rows]
+            for position in range(len(self.columns))
+        ]
+        self.index = range(first_index, first_index + len(rows))
+        self.dirty = bytearray((len(rows) * len(self.columns) + 7) // 8)
+        self.changed: list = []
+
+    @classmethod
+    def from_records(cls, records: list) -> "SheetTable":
+        """Строит таблицу из результата get_all_records."""
+        columns = list(records[0].keys()) if records else []
+        return cls(columns, [list(record.values()) for record in records])
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def rows(self):
+        """Перебирает пары (индекс, строка)."""
+        for position, index in enumerate(self.index):
+            yield index, SheetRow(self, position)
+
+    def row(self, index: int) -> SheetRow:
+        return SheetRow(self, index - self.index.start)
+
+    def get(self, index: int, column: str):
+        return self.data[self.positions[column]][index - self.index.start]
+
+    def is_empty(self, index: int, column: str) -> bool:
+        return is_blank(self.get(index, column))
+
+    def clear(self, index: int, column: str) -> None:
+        """Очищает ячейку и помечает ее как измененную."""
+        position = index - self.index.start
+        column_position = self.positions[column]
+        self.data[column_position][position] = None
+        bit = position * len(self.columns) + column_position
+        if not self.dirty[bit >> 3] & 1 << (bit & 7):
+            self.dirty[bit >> 3] |= 1 << (bit & 7)
+            self.changed.append(bit)
+
+    def dirty_cells(self) -> list:
+        """Возвращает измененные ячейки как пары (индекс, столбец)."""
+        cells = []
+        for bit in sorted(self.changed):
+            position, column_position = divmod(bit, len(self.columns))
+            cells.append((self.index[position], self.columns[column_position]))
+        return cells
+
+    def reset_dirty(self) -> None:
+        for bit in self.changed:
+            self.dirty[bit >> 3] &= ~(1 << (bit & 7))
+        self.changed = []
+
+    def to_rows(self) -> list:
+        """Возвращает значения построчно."""
+        return [list(values) for values in zip(*self.data)] if self.data else []
+
+    def to_pandas(self):
+        """Возвращает таблицу как pandas.DataFrame; pandas нужен только для выгрузки и анализа."""
+        import pandas as pd
+
+        return pd.DataFrame(self.to_rows(), columns=self.columns, index=self.index)
+
+
+class SheetsQuota:
+    """Скользящее окно запросов к Google Sheets за минуту, общее для всех листов одного сервисного аккаунта."""
+
+    def __init__(self, per_minute: int) -> None:
+        self.per_minute = per_minute
+        self.calls: deque = deque()
+        self.lock = threading.Lock()
+
+    def take(self) -> None:
+        """Ждет, пока в текущей минуте не освободится место для запроса."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.calls and now - self.calls[0] >= 60:
+                    self.calls.popleft()
+                if len(self.calls) < self.per_minute:
+                    self.calls.append(now)
+                    return
+                wait = 60 - (now - self.calls[0])
+            time.sleep(wait)
+
+    def used(self) -> int:
+        """Число запросов за последнюю минуту."""
+        with self.lock:
+            now = time.monotonic()
+            return sum(1 for called in self.calls if now - called < 60)
+
+
+# Квоты по сервисному аккаунту: клубы с одним и тем же ключом делят одну квоту
+sheets_quotas: dict = {}
+sheets_quotas_lock = threading.Lock()
+# заранее авторизованные клиенты gspread по пути к файлу учетных данных
+sheets_clients: dict = {}
+sheets_clients_lock = threading.Lock()
+
+
+def sheets_quota(google_credentials_file: str, per_minute: int) -> SheetsQuota:
+    """Возвращает общую квоту для сервисного аккаунта из файла учетных данных."""
+    account = os.path.realpath(google_credentials_file)
+    try:
+        with open(google_credentials_file, "r", encoding="utf-8") as file:
+            account = json.load(file).get("client_email", account)
+    except (OSError, ValueError):
+        pass
+    with sheets_quotas_lock:
+        return sheets_quotas.setdefault(account, SheetsQuota(per_minute))
+
+
+def preauthorize_sheets(google_credentials_file: str) -> None:
+    """Заранее входит в Google по файлу учетных данных; клиент достанется первому подключению к таблице."""
+    started = time.perf_counter()
+    client = gspread.service_account(filename=google_credentials_file)
+    client.http_client.auth.refresh(google_requests.Request())
+    with sheets_clients_lock:
+        sheets_clients[os.path.realpath(google_credentials_file)] = client
+    startup_timings["вход в Google"] = (started - PROCESS_STARTED, time.perf_counter() - started)
+
+
+def sheets_client(google_credentials_file: str):
+    """Клиент gspread: заранее авторизованный при запуске, если он есть, иначе новый."""
+    with sheets_clients_lock:
+        client = sheets_clients.pop(os.path.realpath(google_credentials_file), None)
+    return client or gspread.service_account(filename=google_credentials_file)
+
+
+def import_heavy() -> None:
+    """Импортирует все ленивые зависимости."""
+    for lazy in HEAVY_IMPORTS:
+        lazy.load()
+
+
+def warm_up(google_credentials_file: str, settings: dict) -> None:
+    """Фоновая загрузка после появления окна: импорт selenium и gspread и вход в Google."""
+    import_heavy()
+    if settings["warm_up_sheets"] and google_credentials_file and os.path.exists(google_credentials_file):
+        try:
+            preauthorize_sheets(google_credentials_file)
+        except Exception as e:
+            logging.warning("Не удалось заранее войти в Google: %s", e)
+    logging.info("Запуск: %s", startup_report())
+    if eager_imports:
+        logging.warning("До появления окна загружены: %s", ", ".join(dict.fromkeys(eager_imports)))
 
-CREDENTIALS_FILE = "credentials.json"
+
+def mark_window_ready() -> None:
+    """Запоминает время появления окна и тяжелые модули, загруженные раньше него."""
+    startup_timings["окно"] = (0.0, time.perf_counter() - PROCESS_STARTED)
+    eager_imports.extend(lazy.module for lazy in HEAVY_IMPORTS if lazy.module in sys.modules)
+
+
+def startup_report() -> str:
+    """Время появления окна и стоимость тяжелых импортов и входа в Google в порядке загрузки."""
+    events = sorted(startup_timings.items(), key=lambda item: item[1][0])
+    return ", ".join(f"{name} {duration:.2f} с" for name, (start, duration) in events if duration >= 0.01)
 
 
 class GoogleSheet:
-    def __init__(self, google_credentials_file: str, spreadsheet_url: str, worksheet_name: str) -> None:
+    def __init__(self, google_credentials_file: str, spreadsheet_url: str, worksheet_name: str, quota: SheetsQuota | None = None, client=None) -> None:
         """
         Initialize a GoogleSheet object.
 
@@ -34,61 +484,183 @@ class GoogleSheet:
         :type spreadsheet_url: str
         :param worksheet_name: The name of the worksheet to access.
         :type worksheet_name: str
+        :param quota: Общая квота запросов сервисного аккаунта или None.
+        :type quota: SheetsQuota | None
+        :param client: Готовый клиент gspread вместо входа по файлу учетных данных, например двойник MemorySheetsClient из tests/harness.py.
         :return: None
         :rtype: None
         """
+        self.quota = quota
+        self.cache_dropped = False
         try:
-            self.account = gspread.service_account(filename=google_credentials_file)
+            self.account = client or sheets_client(google_credentials_file)
+            self.throttle()
             self.spreadsheet = self.account.open_by_url(spreadsheet_url)
+            self.throttle()
             self.topics = {elem.title: elem.id for elem in self.spreadsheet.worksheets()}
             if worksheet_name not in self.topics:
                 raise ValueError(f"Worksheet '{worksheet_name}' not found in spreadsheet")
+            self.throttle()
             self.answers = self.spreadsheet.get_worksheet_by_id(self.topics[worksheet_name])
             logging.info("Успешное подключение к Google Sheets")
             update_status("Успешное подключение к Google Sheets")
         except Exception as e:
-            logging.error(f"Ошибка подключения к Google Sheets: {e}")
+            logging.error("Ошибка подключения к Google Sheets: %s", e)
             update_status(f"Ошибка подключения к Google Sheets: {e}")
             raise e
 
-    def load_data_from_google_sheet(self) -> pd.DataFrame:
-        """Загружает данные из Google Sheets."""
+    def throttle(self) -> None:
+        if self.quota is not None:
+            self.quota.take()
+
+    def load_data_from_google_sheet(self) -> SheetTable:
+        """Загружает данные из Google Sheets.
+
+        Если ревизия таблицы не изменилась с прошлой загрузки, данные берутся
+        из локального кэша без скачивания листа.
+        """
         try:
             if not self.spreadsheet:
                 raise ValueError("Spreadsheet is not initialized")
             if not self.topics:
                 raise ValueError("No topics found in the spreadsheet")
-            worksheet = self.spreadsheet.worksheet(worksheet_name_entry.get())
-            if not worksheet:
-                raise ValueError(f"Worksheet '{worksheet_name_entry.get()}' not found in spreadsheet")
-            data = worksheet.get_all_records()
+            revision = self.get_revision()
+            cached = self.read_cache()
+            if revision is not None and cached and cached["revision"] == revision:
+                logging.info("Лист не изменился, данные загружены из кэша")
+                return SheetTable(cached["columns"], cached["rows"])
+            self.throttle()
+            data = self.answers.get_all_records()
             if not data:
                 raise ValueError("No data found in the worksheet")
-            df = pd.DataFrame(data)
+            table = SheetTable.from_records(data)
+            self.write_cache(revision, table)
             logging.info("Данные успешно загружены из Google Sheets")
-            return df
+            return table
         except Exception as e:
-            logging.error(f"Ошибка загрузки данных из Google Sheets: {e}")
+            logging.error("Ошибка загрузки данных из Google Sheets: %s", e)
             raise e
 
-    def save_data_to_google_sheet(self, df: pd.DataFrame) -> None:
-        """Сохраняет DataFrame в указанный лист Google Sheets."""
+    def iter_data_chunks(self, chunk_rows: int):
+        """Читает лист диапазонами строк и отдает SheetTable по каждой порции.
+
+        Индексы строк совпадают с теми, что дал бы load_data_from_google_sheet,
+        поэтому порции можно сразу передавать в clear_cells.
+        """
+        try:
+            self.throttle()
+            header = self.answers.row_values(1)
+            if not header:
+                raise ValueError("No data found in the worksheet")
+            last_column = gspread.utils.rowcol_to_a1(1, len(header))[:-1]
+            for start in range(2, self.answers.row_count + 1, chunk_rows):
+                self.throttle()
+                values = self.answers.get(f"A{start}:{last_column}{start + chunk_rows - 1}")
+                rows = [gspread.utils.numericise_all(row) for row in values]
+                if rows:
+                    yield SheetTable(header, rows, first_index=start - 2)
+            logging.info("Данные успешно загружены из Google Sheets порциями")
+        except Exception as e:
+            logging.error("Ошибка загрузки данных из Google Sheets: %s", e)
+            raise e
+
+    def get_revision(self) -> str | None:
+        """Возвращает время последнего изменения таблицы из метаданных Drive.
+
+        Ревизия общая для всей таблицы: правка любого листа сбрасывает кэш всех ее листов.
+        """
+        try:
+            self.throttle()
+            return self.spreadsheet.get_lastUpdateTime()
+        except Exception as e:
+            logging.warning("Не удалось получить ревизию таблицы, кэш не используется: %s", e)
+            return None
+
+    def cache_path(self) -> str:
+        key = f"{self.spreadsheet.id}:{self.answers.id}"
+        return os.path.join(SHEET_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + ".bin")
+
+    def read_cache(self) -> dict | None:
+        """Читает сохраненные значения листа или возвращает None."""
+        try:
+            if not os.path.exists(self.cache_path()):
+                return None
+            with open(self.cache_path(), "rb") as file:
+                return pickle.loads(zlib.decompress(file.read()))
+        except Exception as e:
+            logging.warning("Кэш листа поврежден и будет перезаписан: %s", e)
+            return None
+
+    def write_cache(self, revision: str | None, table: SheetTable) -> None:
+        """Сохраняет значения листа в сжатом бинарном виде вместе с ревизией."""
+        if revision is None:
+            return
+        try:
+            os.makedirs(SHEET_CACHE_DIR, exist_ok=True)
+            payload = {"revision": revision, "columns": table.columns, "rows": table.to_rows()}
+            with open(self.cache_path(), "wb") as file:
+                file.write(zlib.compress(pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)))
+        except Exception as e:
+            logging.warning("Не удалось сохранить кэш листа: %s", e)
+
+    def drop_cache(self) -> None:
+        """Удаляет кэш листа после первой записи в него.
+
+        Ревизия, прочитанная после записи, покрывает и правки учителей за время
+        запуска, поэтому сохранить под ней таблицу начала запуска нельзя: новые
+        отметки пропускались бы до следующей правки листа.
+        """
+        if self.cache_dropped:
+            return
+        self.cache_dropped = True
+        try:
+            os.remove(self.cache_path())
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logging.warning("Не удалось удалить кэш листа: %s", e)
+
+    def clear_cells(self, table: SheetTable, cells: list) -> None:
+        """Очищает только указанные ячейки листа, не трогая остальные.
+
+        :param cells: Пары (индекс строки таблицы, название столбца).
+        """
+        try:
+            ranges = [
+                gspread.utils.rowcol_to_a1(index + 2, table.positions[column] + 1)
+                for index, column in cells
+            ]
+            with run_metrics.timed("writeback"):
+                self.throttle()
+                self.answers.batch_clear(ranges)
+            self.drop_cache()
+            logging.info("Очищено ячеек в Google Sheets: %s", len(ranges))
+        except Exception as e:
+            logging.error("Ошибка очистки ячеек в Google Sheets: %s", e)
+            raise e
+
+    def write_cleared(self, table: SheetTable, cells: list) -> None:
+        """Очищает ячейки начисленных отметок в таблице и записывает изменения в лист."""
+        for index, column in cells:
+            table.clear(index, column)
+        self.save_data_to_google_sheet(table)
+
+    def save_data_to_google_sheet(self, table: SheetTable) -> None:
+        """Записывает в Google Sheets только измененные ячейки таблицы."""
         try:
             if not self.spreadsheet:
                 raise ValueError("Spreadsheet is not initialized")
             if not self.topics:
                 raise ValueError("No topics found in the spreadsheet")
-            worksheet = self.spreadsheet.worksheet(worksheet_name_entry.get())
-            if not worksheet:
-                raise ValueError(f"Worksheet '{worksheet_name_entry.get()}' not found in spreadsheet")
-            worksheet.clear()
-            worksheet.update([df.columns.values.tolist()] + df.values.tolist())
+            cells = table.dirty_cells()
+            if cells:
+                self.clear_cells(table, cells)
+            table.reset_dirty()
             logging.info("Данные успешно сохранены в Google Sheets")
         except Exception as e:
-            logging.error(f"Ошибка сохранения данных в Google Sheets: {e}")
+            logging.error("Ошибка сохранения данных в Google Sheets: %s", e)
             raise e
 
-
 def choose_google_credentials_file() -> None:
     """Открывает диалог выбора файла для учетных данных Google."""
     file_path = filedialog.askopenfilename(title="Выберите файл учетных данных Google",
@@ -119,7 +691,7 @@ def load_credentials() -> None:
             logging.info("Учетные данные успешно загружены из JSON")
             update_status("Учетные данные успешно загружены из JSON")
     except Exception as e:
-        logging.error(f"Ошибка загрузки учетных данных: {e}")
+        logging.error("Ошибка загрузки учетных данных: %s", e)
         update_status(f"Ошибка загрузки учетных данных: {e}")
 
 
@@ -145,13 +717,78 @@ def save_credentials():
                 logging.info("Файл учетных данных удален либо не найден")
                 update_status("Файл учетных данных удален либо не найден")
     except Exception as e:
-        logging.error(f"Ошибка сохранения учетных данных: {e}")
+        logging.error("Ошибка сохранения учетных данных: %s", e)
         update_status(f"Ошибка сохранения учетных данных: {e}")
 
 
-def init_driver() -> webdriver.Chrome:
+def load_settings() -> dict:
+    """Загружает настройки из settings.json поверх значений по умолчанию."""
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        if os.path.exists(SETTINGS_FILE):
+            with open(SETTINGS_FILE, "r", encoding="utf-8") as file:
+                settings.update(json.load(file))
+            logging.info("Настройки успешно загружены из JSON")
+    except Exception as e:
+        logging.error("Ошибка загрузки настроек: %s", e)
+    return settings
+
+
+def warn_without_psutil(settings: dict) -> None:
+    """Предупреждает, что без psutil память Chrome не измеряется и driver_max_rss_mb не действует."""
+    if psutil is None and settings["driver_max_rss_mb"]:
+        logging.warning("Пакет psutil не установлен: ограничение памяти Chrome driver_max_rss_mb не действует, установите его из requirements.txt")
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись журнала одной строкой JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"time": self.formatTime(record, "%Y-%m-%d %H:%M:%S"), "level": record.levelname, "thread": record.threadName, "line": record.lineno, "message": record.getMessage()}
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class LazyQueueHandler(QueueHandler):
+    """Кладет запись в очередь как есть: сообщение собирается из аргументов уже в потоке журнала."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging() -> QueueListener:
+    """Переводит журнал на очередь: рабочие потоки только кладут записи, форматирует и пишет их отдельный поток.
+
+    В консоль пишется прежний текстовый формат, в LOG_FILE - строки JSON с ротацией файла.
+    """
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers: list = [console]
+    try:
+        os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+        file_handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    except OSError as e:
+        print(f"Журнал в файл недоступен: {e}", file=sys.stderr)
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(LazyQueueHandler(records))
+    listener = QueueListener(records, *handlers)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def init_driver(performance_log: bool = False) -> webdriver.Chrome:
     """Инициализирует и возвращает объект Selenium WebDriver типа webdriver.Chrome.
 
+    Args:
+        performance_log: Включить журнал производительности Chrome для записи сайта и сетевых замеров.
+
     Returns:
         webdriver.Chrome: Инициализированный объект WebDriver.
     """
@@ -164,6 +801,8 @@ def init_driver() -> webdriver.Chrome:
             logging.error("Service could not be created.")
             raise RuntimeError("Service could not be created.")
         options: webdriver.ChromeOptions = webdriver.ChromeOptions()
+        if performance_log:
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
         driver: webdriver.Chrome = webdriver.Chrome(service=service, options=options)
         if not driver:
             logging.error("Driver could not be created.")
@@ -171,14 +810,14 @@ def init_driver() -> webdriver.Chrome:
         logging.info("WebDriver успешно инициализирован")
         return driver
     except FileNotFoundError as e:
-        logging.error(f"Ошибка инициализации WebDriver: {e}")
+        logging.error("Ошибка инициализации WebDriver: %s", e)
         raise e
     except RuntimeError as e:
-        logging.error(f"Ошибка инициализации WebDriver: {e}")
+        logging.error("Ошибка инициализации WebDriver: %s", e)
         raise e
 
 
-def login_to_site(driver: webdriver.Chrome, login: str, password: str) -> bool:
+def login_to_site(driver: webdriver.Chrome, login: str, password: str, site_url: str = SITE_URL) -> bool:
     """
     Выполняет вход на сайт с указанными логином и паролем.
 
@@ -194,433 +833,2805 @@ def login_to_site(driver: webdriver.Chrome, login: str, password: str) -> bool:
         messagebox.showerror("Ошибка входа", "Login or password is null or empty")
         return False
     try:
-        driver.get('https://kiber-one.club/')
+        driver.get(site_url)
         WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.NAME, 'login')))
         driver.find_element(By.NAME, 'login').send_keys(login)
         driver.find_element(By.NAME, 'password').send_keys(password)
         driver.find_element(By.XPATH, '//*[@id="loginForm"]/table/tbody/tr[4]/td/input').click()
-        WebDriverWait(driver, 10).until(EC.url_changes('https://kiber-one.club/'))
+        WebDriverWait(driver, 10).until(EC.url_changes(site_url))
         logging.info("Успешный вход на сайт")
         update_status("Успешный вход на сайт")
         return True
-    except (NoSuchElementException, TimeoutException) as e:
-        logging.error(f"Ошибка входа на сайт: {e}")
+    except (selenium_exceptions.NoSuchElementException, selenium_exceptions.TimeoutException) as e:
+        logging.error("Ошибка входа на сайт: %s", e)
         update_status(f"Ошибка входа на сайт: {e}")
         messagebox.showerror("Ошибка входа", f"Не удалось войти на сайт: {e}")
         driver.quit()
         return False
 
 
-def find_and_open_user(driver, row) -> bool:
-    """Функция поиска и открытия профиля пользователя"""
+def process_tree_rss_mb(pid: int) -> float | None:
+    """Возвращает суммарную резидентную память процесса и всех его потомков в МБ."""
+    if psutil is None:
+        return None
     try:
-        search_field = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH,
-                                            '/html/body/div[1]/div/div/div/div/div[2]/div[2]/div/div/div[2]/input'))
+        root_process = psutil.Process(pid)
+        total = 0
+        for process in [root_process] + root_process.children(recursive=True):
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / (1024 * 1024)
+    except psutil.Error:
+        return None
+
+
+def render_sparkline(values: list, width: int = 60) -> str:
+    """Рисует ряд значений строкой из блочных символов."""
+    if not values:
+        return ""
+    step = max(1, -(-len(values) // width))
+    buckets = [max(values[i : i + step]) for i in range(0, len(values), step)]
+    low, high = min(buckets), max(buckets)
+    span = (high - low) or 1
+    return "".join(
+        SPARK_CHARS[int((value - low) / span * (len(SPARK_CHARS) - 1))]
+        for value in buckets
+    )
+
+
+def safe_name(text: str) -> str:
+    """Имя для файла или папки: все, кроме букв и цифр, заменяется на _."""
+    return "".join(char if char.isalnum() else "_" for char in text)
+
+
+class RunProfile:
+    """Собирает метрики запуска и сохраняет их в JSON-файл профиля."""
+
+    # (ряд, поле) для графиков в профиле
+    CHARTS = [
+        ("memory", "chrome_rss_mb"),
+        ("action", "latency"),
+        ("aimd", "limit"),
+        ("aimd", "throughput"),
+        ("commands", "total"),
+        ("python_memory", "rss_mb"),
+        ("python_memory", "traced_mb"),
+    ]
+
+    def __init__(self, name: str = "") -> None:
+        self.name = name
+        self.started = time.time()
+        self.series: dict[str, list] = {}
+        self.events: list[dict] = []
+        self.lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return round(time.time() - self.started, 3)
+
+    def sample(self, series: str, **values) -> None:
+        """Добавляет точку в именованный ряд метрик."""
+        with self.lock:
+            self.series.setdefault(series, []).append({"t": self.elapsed(), **values})
+
+    def event(self, kind: str, **values) -> None:
+        """Записывает разовое событие запуска."""
+        with self.lock:
+            self.events.append({"t": self.elapsed(), "kind": kind, **values})
+
+    def save(self) -> str | None:
+        """Сохраняет профиль в папку profiles и возвращает путь к файлу."""
+        try:
+            os.makedirs(PROFILES_DIR, exist_ok=True)
+            suffix = safe_name(self.name)
+            stamp = time.strftime("run-%Y%m%d-%H%M%S", time.localtime(self.started))
+            path = os.path.join(PROFILES_DIR, f"{stamp}-{suffix}.json" if suffix else f"{stamp}.json")
+            with self.lock:
+                charts = {}
+                for series, field in self.CHARTS:
+                    values = [
+                        point[field]
+                        for point in self.series.get(series, [])
+                        if point.get(field) is not None
+                    ]
+                    charts[f"{series}.{field}"] = render_sparkline(values)
+                report = {
+                    "started": time.strftime(
+                        "%Y-%m-%d %H:%M:%S", time.localtime(self.started)
+                    ),
+                    "duration": self.elapsed(),
+                    "charts": charts,
+                    "series": self.series,
+                    "events": self.events,
+                }
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            logging.info("Профиль запуска сохранен: %s", path)
+            return path
+        except Exception as e:
+            logging.error("Ошибка сохранения профиля запуска: %s", e)
+            return None
+
+
+def read_performance_log(driver) -> list:
+    """Вычитывает накопленные сообщения журнала производительности Chrome."""
+    try:
+        return [json.loads(entry["message"])["message"] for entry in driver.get_log("performance")]
+    except Exception as e:
+        logging.warning("Не удалось прочитать журнал Chrome: %s", e)
+        return []
+
+
+class TrafficRecorder:
+    """Записывает запросы к сайту и ответы на них из журнала производительности Chrome.
+
+    Тела ответов забираются через CDP Network.getResponseBody, пока они еще
+    в буфере браузера, поэтому журнал вычитывается после каждого действия.
+    Заголовки и cookies не сохраняются, картинки сохраняются без содержимого.
+    """
+
+    def __init__(self, directory: str, site_url: str) -> None:
+        self.directory = directory
+        self.site_url = site_url
+        self.pending: dict = {}
+        self.entries: list = []
+
+    def drain(self, driver, messages: list) -> None:
+        """Переносит завершенные запросы к сайту из журнала Chrome в запись."""
+        for message in messages:
+            params = message.get("params", {})
+            request_id = params.get("requestId")
+            if message["method"] == "Network.requestWillBeSent":
+                redirect = params.get("redirectResponse")
+                if redirect and request_id in self.pending:
+                    item = self.pending.pop(request_id)
+                    item.update(status=redirect["status"], mime="", location=redirect.get("headers", {}).get("Location", ""))
+                    item["duration"] = params["timestamp"] - item.pop("started")
+                    item["body"], item["base64"] = "", False
+                    self.entries.append(item)
+                request = params["request"]
+                if request["url"].startswith(self.site_url):
+                    parts = urllib.parse.urlsplit(request["url"])
+                    self.pending[request_id] = {
+                        "method": request["method"],
+                        "path": parts.path + (f"?{parts.query}" if parts.query else ""),
+                        "post": request.get("postData", ""),
+                        "started": params["timestamp"],
+                    }
+            elif message["method"] == "Network.responseReceived" and request_id in self.pending:
+                response = params["response"]
+                self.pending[request_id].update(status=response["status"], mime=response.get("mimeType", ""), location="")
+            elif message["method"] == "Network.loadingFinished" and request_id in self.pending:
+                item = self.pending.pop(request_id)
+                item["duration"] = params["timestamp"] - item.pop("started")
+                item.setdefault("status", 200)
+                item.setdefault("mime", "")
+                item.setdefault("location", "")
+                item["body"], item["base64"] = "", False
+                if not item["mime"].startswith("image/"):
+                    try:
+                        body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+                        item["body"], item["base64"] = body["body"], body["base64Encoded"]
+                    except Exception as e:
+                        logging.debug("Тело ответа %s недоступно: %s", item["path"], e)
+                self.entries.append(item)
+
+    def save(self, secrets: list, names: list) -> str | None:
+        """Сохраняет набор для воспроизведения, заменив логин, пароль, ФИО, почту, телефоны и даты.
+
+        ФИО заменяются целиком и по отдельным словам (фамилия без имени, имя
+        перед фамилией), в том числе в URL, JSON (\\uXXXX) и HTML-сущностях.
+        Данные, которых нет в таблице (например, ФИО родителей), не заменяются.
+        """
+        if not self.entries:
+            return None
+        replacements = [(scrub_pattern(secret, words=False), "secret") for secret in secrets if secret]
+        ordered = sorted(dict.fromkeys(str(name).strip() for name in names if not is_blank(name)), key=len, reverse=True)
+        words: dict = {}
+        for position, name in enumerate(ordered, start=1):
+            replacements.append((scrub_pattern(name), f"Ученик {position}"))
+            for word in name.split():
+                words.setdefault(word.lower(), (word, position))
+        replacements += [(scrub_pattern(word), f"Ученик {position}") for word, position in sorted(words.values(), key=lambda item: len(item[0]), reverse=True) if len(word) > 1]
+        entries = []
+        for entry in self.entries:
+            entry = dict(entry)
+            for field in ("path", "post", "location") + (() if entry["base64"] else ("body",)):
+                entry[field] = scrub_text(entry[field], replacements)
+            entries.append(entry)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, time.strftime("bundle-%Y%m%d-%H%M%S.json"))
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump({"site_url": self.site_url, "entries": entries}, file, ensure_ascii=False)
+            logging.info("Записано запросов к сайту: %s, набор: %s", len(entries), path)
+            return path
+        except OSError as e:
+            logging.error("Ошибка сохранения записи сайта: %s", e)
+            return None
+
+
+def endpoint_name(method: str, url: str) -> str:
+    """Адрес запроса без параметров; числа в пути заменены на :id, чтобы запросы разных учеников сводились вместе."""
+    path = re.sub(r"\d+", ":id", urllib.parse.urlsplit(url).path)
+    return f"{method} {path}"
+
+
+class NetworkTiming:
+    """Сетевые замеры каждого начисления из журнала производительности Chrome.
+
+    Учитываются переходы по страницам и XHR к сайту. Время запроса делится на
+    DNS, соединение, ожидание первого байта (время сервера) и скачивание;
+    время начисления, не покрытое запросами, - ожидание на стороне клиента.
+    """
+
+    TYPES = ("Document", "XHR", "Fetch")
+
+    def __init__(self, site_url: str) -> None:
+        self.site_url = site_url
+        self.pending: dict = {}
+        self.finished: list = []
+        self.endpoints: dict = {}
+
+    def drain(self, messages: list) -> None:
+        """Разбирает сообщения журнала Chrome и откладывает завершенные запросы к сайту."""
+        for message in messages:
+            params = message.get("params", {})
+            request_id = params.get("requestId")
+            if message["method"] == "Network.requestWillBeSent":
+                request = params["request"]
+                if params.get("type") in self.TYPES and request["url"].startswith(self.site_url):
+                    self.pending[request_id] = {"endpoint": endpoint_name(request["method"], request["url"]), "started": params["timestamp"], "timing": None}
+            elif message["method"] == "Network.responseReceived" and request_id in self.pending:
+                self.pending[request_id]["timing"] = params["response"].get("timing")
+            elif message["method"] in ("Network.loadingFinished", "Network.loadingFailed") and request_id in self.pending:
+                self.finished.append(self.measure(self.pending.pop(request_id), params["timestamp"]))
+
+    @staticmethod
+    def measure(item: dict, finished: float) -> dict:
+        """Этапы запроса в миллисекундах по Network.ResourceTiming; None, если этапа не было."""
+        timing = item["timing"] or {}
+
+        def span(start: str, end: str) -> float | None:
+            if timing.get(start, -1) < 0 or timing.get(end, -1) < 0:
+                return None
+            return round(timing[end] - timing[start], 1)
+
+        download = None
+        if timing:
+            headers_end = timing["requestTime"] + timing["receiveHeadersEnd"] / 1000
+            download = round(max(finished - headers_end, 0) * 1000, 1)
+        return {
+            "endpoint": item["endpoint"],
+            "start": item["started"],
+            "end": finished,
+            "total": round((finished - item["started"]) * 1000, 1),
+            "dns": span("dnsStart", "dnsEnd"),
+            "connect": span("connectStart", "connectEnd"),
+            "ttfb": span("sendEnd", "receiveHeadersEnd"),
+            "download": download,
+        }
+
+    def award(self, column: str, seconds: float, spans: list, profile: RunProfile) -> None:
+        """Связывает запросы, завершившиеся за время начисления, с замерами его шагов в Python."""
+        requests, self.finished = self.finished, []
+        covered, reach = 0.0, None
+        for start, end in sorted((request["start"], request["end"]) for request in requests):
+            if reach is None or start > reach:
+                covered += end - start
+                reach = end
+            elif end > reach:
+                covered += end - reach
+                reach = end
+        steps: dict = {}
+        for step, step_seconds in spans:
+            steps[step] = round(steps.get(step, 0) + step_seconds * 1000, 1)
+        for request in requests:
+            self.endpoints.setdefault(request["endpoint"], []).append(request)
+        profile.sample(
+            "network",
+            column=column,
+            python_ms=round(seconds * 1000, 1),
+            network_ms=round(covered * 1000, 1),
+            server_ms=round(sum(request["ttfb"] or 0 for request in requests), 1),
+            client_ms=round(max(seconds - covered, 0) * 1000, 1),
+            steps=steps,
+            requests=[{key: value for key, value in request.items() if key not in ("start", "end")} for request in requests],
         )
-        search_field.clear()
-        search_field.send_keys(row['фио'])
 
-        user_item = WebDriverWait(driver, 1).until(
-            EC.presence_of_element_located((By.XPATH,
-                                            '//div[contains(@class, "user_item") and @style="display: table-row;"]'))
+    def report(self, profile: RunProfile) -> list:
+        """Самые медленные адреса сайта по медиане длительности; пишутся в журнал и профиль."""
+        rows = []
+        for endpoint, requests in self.endpoints.items():
+            ttfb = [request["ttfb"] for request in requests if request["ttfb"] is not None]
+            download = [request["download"] for request in requests if request["download"] is not None]
+            rows.append(
+                {
+                    "endpoint": endpoint,
+                    "count": len(requests),
+                    "median_ms": statistics.median(request["total"] for request in requests),
+                    "max_ms": max(request["total"] for request in requests),
+                    "ttfb_ms": statistics.median(ttfb) if ttfb else None,
+                    "download_ms": statistics.median(download) if download else None,
+                }
+            )
+        rows.sort(key=lambda row: row["median_ms"], reverse=True)
+        rows = rows[:NETWORK_TOP_ENDPOINTS]
+        if rows:
+            profile.event("network_endpoints", endpoints=rows)
+            logging.info("Самые медленные запросы к сайту:\n%s", "\n".join(f"{row['endpoint']}: медиана {row['median_ms']} мс, ответ сервера {row['ttfb_ms']} мс, запросов {row['count']}" for row in rows))
+        return rows
+
+
+def escaped_forms(text: str) -> list:
+    """Написания строки в запросах и ответах сайта в трех регистрах: как есть, в URL, в JSON и HTML-сущностями."""
+    forms = []
+    for variant in (text, text.lower(), text.upper()):
+        forms += [
+            variant,
+            urllib.parse.quote_plus(variant),
+            urllib.parse.quote(variant),
+            json.dumps(variant)[1:-1],
+            "".join(f"&#{ord(char)};" for char in variant),
+            "".join(f"&#x{ord(char):x};" for char in variant),
+        ]
+    return sorted(dict.fromkeys(forms), key=len, reverse=True)
+
+
+def scrub_pattern(text: str, words: bool = True) -> re.Pattern:
+    """Выражение для всех написаний text без учета регистра; при words - только целым словом."""
+    pattern = "|".join(re.escape(form) for form in escaped_forms(text))
+    return re.compile(rf"(?<!\w)(?:{pattern})(?!\w)" if words else pattern, re.IGNORECASE)
+
+
+def scrub_text(text: str, replacements: list) -> str:
+    for pattern, new in replacements:
+        text = pattern.sub(lambda match: new, text)
+    text = EMAIL_PATTERN.sub("user@example.com", text)
+    text = PHONE_PATTERN.sub("+70000000000", text)
+    return DATE_PATTERN.sub("01.01.2000", text)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Отдает записанные ответы сайта; одинаковые запросы получают записанные ответы по очереди."""
+
+    def do_GET(self) -> None:
+        self.replay()
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.replay()
+
+    def replay(self) -> None:
+        server = self.server
+        key = f"{self.command} {self.path}"
+        with server.lock:
+            entries = server.entries.get(key) or server.entries.get(f"{self.command} {self.path.split('?')[0]}")
+            if not entries:
+                self.send_error(404, "Not recorded")
+                return
+            position = server.cursors.get(key, 0)
+            server.cursors[key] = position + 1
+        plan = server.faults.plan(self.command, self.path) if server.faults else {"delay": 0.0, "drop": False, "stale": False, "status": None}
+        if plan["stale"] and position > 0:
+            position -= 1
+        entry = entries[position % len(entries)]
+        time.sleep(entry["duration"] * server.time_scale + plan["delay"])
+        if plan["drop"]:
+            self.close_connection = True
+            return
+        if plan["status"] is not None:
+            self.send_error(plan["status"], "Injected fault")
+            return
+        if entry["base64"]:
+            body = base64.b64decode(entry["body"])
+        else:
+            body = entry["body"].replace(server.site_url, server.base_url).encode("utf-8")
+        self.send_response(entry["status"])
+        if entry["mime"]:
+            self.send_header("Content-Type", entry["mime"] + ("" if entry["base64"] else "; charset=utf-8"))
+        if entry["location"]:
+            self.send_header("Location", entry["location"].replace(server.site_url, server.base_url))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug(format, *args)
+
+
+def make_replay_server(bundle_path: str, port: int = 0, time_scale: float = 1.0, faults=None) -> ThreadingHTTPServer:
+    """Создает локальный сервер из набора записи; time_scale умножает записанные задержки (0 - без задержек), faults - неполадки: объект с методом plan(method, path), например FaultInjector из tests/harness.py."""
+    with open(bundle_path, "r", encoding="utf-8") as file:
+        bundle = json.load(file)
+    server = ThreadingHTTPServer(("127.0.0.1", port), ReplayHandler)
+    server.entries = {}
+    for entry in bundle["entries"]:
+        server.entries.setdefault(f"{entry['method']} {entry['path']}", []).append(entry)
+    server.cursors = {}
+    server.lock = threading.Lock()
+    server.time_scale = time_scale
+    server.faults = faults
+    server.site_url = bundle["site_url"]
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    return server
+
+
+def serve_replay(bundle_path: str, port: int, time_scale: float) -> None:
+    """Запускает сервер воспроизведения до Ctrl+C."""
+    server = make_replay_server(bundle_path, port, time_scale)
+    print(f"Сайт воспроизводится по адресу {server.base_url} - укажите его в site_url в settings.json")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def open_users_page(driver) -> None:
+    """Открывает список пользователей сайта."""
+    link = driver.find_element(By.LINK_TEXT, "Пользователи")
+    link.click()
+    time.sleep(1)
+
+
+class CommandCounter:
+    """Считает команды WebDriver (каждая - HTTP-запрос к chromedriver) и их длительность по видам.
+
+    Команды внутри scope() относятся к текущему начислению, остальные - ко входу
+    и служебным действиям. Ожидания WebDriverWait видны как повторы команд,
+    которыми они опрашивают страницу.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.totals: dict = {}
+        self.current: dict | None = None
+
+    def attach(self, driver) -> None:
+        """Подменяет execute у экземпляра драйвера: через него идут команды и драйвера, и его элементов."""
+        execute = driver.execute
+
+        def counted(driver_command: str, params: dict | None = None):
+            started = time.perf_counter()
+            try:
+                return execute(driver_command, params)
+            finally:
+                self.add(driver_command, time.perf_counter() - started)
+
+        driver.execute = counted
+
+    def add(self, command: str, seconds: float) -> None:
+        with self.lock:
+            total = self.totals.setdefault(command, [0, 0.0])
+            total[0] += 1
+            total[1] += seconds
+            if self.current is not None:
+                self.current[command] = self.current.get(command, 0) + 1
+
+    @contextmanager
+    def scope(self):
+        """Собирает команды одного действия в словарь {команда: число}."""
+        counts: dict = {}
+        self.current = counts
+        try:
+            yield counts
+        finally:
+            self.current = None
+
+    def report(self, profile: RunProfile) -> dict:
+        """Итог по видам команд за запуск: число, общее и среднее время; пишется в журнал и профиль."""
+        with self.lock:
+            summary = {command: {"count": count, "seconds": round(seconds, 3), "mean_ms": round(seconds / count * 1000, 1)} for command, (count, seconds) in sorted(self.totals.items(), key=lambda item: -item[1][0])}
+        if summary:
+            profile.event("webdriver_commands", commands=summary)
+            logging.info("Команды WebDriver за запуск: %s", ", ".join(f"{command} - {stats['count']} ({stats['mean_ms']} мс)" for command, stats in summary.items()))
+        return summary
+
+
+class MemoryTelemetry:
+    """Память самого бота (не Chrome): RSS процесса и снимки tracemalloc каждые every учеников.
+
+    Снимок сравнивается с предыдущим, и самые выросшие места выделения памяти
+    попадают в профиль; в конце запуска - рост с первого снимка. Место - строка,
+    где выделена память, и строка бота, откуда пришел вызов.
+    """
+
+    def __init__(self, every: int) -> None:
+        self.every = every
+        start_tracing()
+        self.first = self.previous = self.snapshot()
+
+    @staticmethod
+    def snapshot():
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap>"), tracemalloc.Filter(False, "<unknown>")])
+
+    @staticmethod
+    def growth(snapshot, since) -> list:
+        """Самые выросшие места выделения памяти между двумя снимками."""
+        sites = []
+        for stat in snapshot.compare_to(since, "traceback")[:MEMORY_TOP_SITES]:
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[-1]
+            caller = next((caller for caller in reversed(stat.traceback) if caller.filename == __file__), None)
+            sites.append({
+                "site": f"{frame.filename}:{frame.lineno}",
+                "caller": None if caller is None else caller.lineno,
+                "size_kb": round(stat.size_diff / 1024, 1),
+                "count": stat.count_diff,
+            })
+        return sites
+
+    def sample(self, students: int, profile: RunProfile) -> None:
+        """Замер после очередного ученика; снимок делается только каждые every учеников."""
+        if students % self.every:
+            return
+        traced, peak = tracemalloc.get_traced_memory()
+        rss = None
+        if psutil is not None:
+            try:
+                rss = round(psutil.Process().memory_info().rss / 1024 / 1024, 1)
+            except psutil.Error:
+                pass
+        profile.sample("python_memory", students=students, rss_mb=rss, traced_mb=round(traced / 1024 / 1024, 1), peak_mb=round(peak / 1024 / 1024, 1))
+        snapshot = self.snapshot()
+        sites = self.growth(snapshot, self.previous)
+        self.previous = snapshot
+        if sites:
+            profile.event("memory_growth", students=students, sites=sites)
+
+    def report(self, profile: RunProfile) -> list:
+        """Рост памяти с первого снимка по местам выделения; пишется в журнал и профиль."""
+        sites = self.growth(self.snapshot(), self.first)
+        stop_tracing()
+        if sites:
+            profile.event("memory_leaks", sites=sites)
+            logging.info("Рост памяти бота за запуск: %s", ", ".join(f"{site['site']} +{site['size_kb']} КБ" for site in sites[:3]))
+        return sites
+
+
+# Снимки памяти нужны, пока идет хотя бы один запуск с телеметрией: tracemalloc общий на процесс
+memory_tracers = 0
+memory_tracers_lock = threading.Lock()
+
+
+def start_tracing() -> None:
+    global memory_tracers
+    with memory_tracers_lock:
+        if memory_tracers == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACE_FRAMES)
+        memory_tracers += 1
+
+
+def stop_tracing() -> None:
+    global memory_tracers
+    with memory_tracers_lock:
+        memory_tracers -= 1
+        if memory_tracers == 0:
+            tracemalloc.stop()
+
+
+def parse_balance(text: str | None) -> float | None:
+    """Число из текста баланса на сайте («1 250 киб.» -> 1250.0) или None."""
+    if text is None:
+        return None
+    match = re.search(r"-?\d+(?:[.,]\d+)?", re.sub(r"\s", "", text))
+    return float(match.group().replace(",", ".")) if match else None
+
+
+class BalanceReconciler:
+    """Сверка балансов киберонов: список пользователей читается целиком в начале и в конце запуска.
+
+    Ожидаемое изменение баланса ученика - сумма его успешных начислений по
+    award_amounts (киберонов за одну отправку формы), штраф списывает свое
+    значение. Балансы различаются по ссылке на профиль, поэтому тезки на сайте и
+    ученики с начислением, сумма которого неизвестна, не сверяются.
+    """
+
+    def __init__(self, selector: str, amounts: dict) -> None:
+        self.selector = selector
+        self.amounts = amounts
+        self.before: dict | None = None
+        self.users: dict = {}
+        self.expected: dict = {}
+        self.awards: dict = {}
+        self.unknown: set = set()
+        self.lock = threading.Lock()
+
+    def read(self, driver) -> tuple:
+        """Балансы со страницы списка пользователей: ({ссылка на профиль: баланс}, {нормализованное ФИО: [ссылки]})."""
+        balances: dict = {}
+        users: dict = {}
+        for link, name, text in driver.execute_script(USER_BALANCES_SCRIPT, self.selector) or []:
+            balance = parse_balance(text)
+            if link and balance is not None:
+                balances[link] = balance
+                users.setdefault(normalize_name(name), []).append(link)
+        return balances, users
+
+    def start(self, driver) -> None:
+        """Запоминает балансы до первого начисления; после перезапуска браузера не перечитывает."""
+        if self.before is None:
+            self.before, self.users = self.read(driver)
+            logging.info("Прочитаны балансы пользователей: %s", len(self.before))
+
+    def amount(self, rule: dict, value) -> float | None:
+        if rule["kind"] == "penalty":
+            return -float(value)
+        per_step = self.amounts.get(rule["column"])
+        return None if per_step is None else per_step * award_steps(rule, value)
+
+    def covers(self, rule: dict) -> bool:
+        """Известна ли сумма начисления по правилу."""
+        return rule["kind"] == "penalty" or rule["column"] in self.amounts
+
+    def key(self, name: str) -> str | None:
+        """Ссылка на профиль ученика с ФИО name; у тезок None: их балансы по имени не различить."""
+        links = self.users.get(normalize_name(name), [])
+        return links[0] if len(links) == 1 else None
+
+    def expect(self, name: str, row, rule: dict, confirmed: bool) -> None:
+        """Учитывает успешное начисление ученику с ФИО name на сайте; confirmed - сайт подтвердил начисление.
+
+        Повтор того же начисления не учитывается второй раз.
+        """
+        key = self.key(name)
+        amount = self.amount(rule, row[rule["column"]])
+        with self.lock:
+            if key is None:
+                key = normalize_name(name)
+                if key not in self.unknown:
+                    logging.warning("Баланс %s не сверяется: на сайте нет ровно одного пользователя с таким ФИО", name)
+                self.unknown.add(key)
+            awards = self.awards.setdefault(key, [])
+            if any(known["column"] == rule["column"] for _, known, _, _ in awards):
+                return
+            awards.append((row, rule, amount, confirmed))
+            if amount is None:
+                self.unknown.add(key)
+            else:
+                self.expected[key] = self.expected.get(key, 0) + amount
+
+    def compare(self, after: dict) -> list:
+        """Ученики, чей баланс изменился не так, как ожидалось: (ключ, ожидалось, вышло или None)."""
+        mismatches = []
+        for key, expected in self.expected.items():
+            if key in self.unknown:
+                continue
+            actual = after[key] - self.before[key] if key in after and key in self.before else None
+            if actual is None or abs(actual - expected) > 1e-6:
+                mismatches.append((key, expected, actual))
+        return mismatches
+
+    def lost_award(self, key: str, expected: float, actual: float | None) -> tuple | None:
+        """Неподтвержденное начисление (строка, правило), потерю которого однозначно объясняет недостача, или None.
+
+        Подтвержденное сайтом начисление не повторяется: недостачу тогда объясняет
+        что-то другое, например покупка в магазине во время запуска.
+        """
+        if actual is None:
+            return None
+        candidates = [(row, rule) for row, rule, amount, confirmed in self.awards[key] if not confirmed and amount == expected - actual]
+        return candidates[0] if len(candidates) == 1 else None
+
+    def student(self, key: str) -> str:
+        return str(self.awards[key][0][0]["фио"])
+
+
+def reconcile_balances(supervisor: DriverSupervisor) -> list:
+    """Сверяет балансы в конце запуска: однозначно потерянные начисления повторяет, об остальных расхождениях сообщает."""
+    balances = supervisor.balances
+    driver = supervisor.driver
+    if balances is None or balances.before is None or driver is None or not balances.expected:
+        return []
+    open_users_page(driver)
+    mismatches = balances.compare(balances.read(driver)[0])
+    retried = False
+    for key, expected, actual in mismatches:
+        lost = balances.lost_award(key, expected, actual)
+        if lost is None or stop_event.is_set():
+            continue
+        row, rule = lost
+        logging.warning("Баланс %s изменился на %s вместо %s, повтор начисления %s", row["фио"], actual, expected, rule["label"])
+        run_metrics.plan(1)
+        result = apply_rule(supervisor, driver, row, rule, confirm=True)
+        supervisor.profile.event("balance_retry", student=str(row["фио"]), column=rule["column"], result=result.value)
+        retried = True
+    if retried:
+        open_users_page(driver)
+        mismatches = balances.compare(balances.read(driver)[0])
+    supervisor.profile.event(
+        "balance_check",
+        students=len(balances.awards),
+        unchecked=len(balances.unknown),
+        mismatches=[{"student": balances.student(key), "expected": expected, "actual": actual} for key, expected, actual in mismatches],
+    )
+    if not mismatches:
+        logging.info("Балансы сошлись у учеников: %s, не сверялись: %s", len(balances.awards) - len(balances.unknown), len(balances.unknown))
+        return []
+    lines = [f"{balances.student(key)}: ожидалось {expected:+g}, " + ("баланс не найден" if actual is None else f"изменился на {actual:+g}") for key, expected, actual in mismatches]
+    logging.warning("Баланс не сошелся у учеников (%s):\n%s", len(lines), "\n".join(lines))
+    update_status(f"Баланс не сошелся у учеников ({len(lines)}): {'; '.join(lines)}")
+    return mismatches
+
+
+class DriverSupervisor:
+    """Следит за памятью и скоростью Chrome и пересоздает драйвер между учениками."""
+
+    def __init__(self, login: str, password: str, settings: dict, profile: RunProfile, slots: threading.Semaphore | None = None) -> None:
+        self.login = login
+        self.password = password
+        self.club = login
+        self.site_url: str = settings["site_url"]
+        self.recorder = TrafficRecorder(settings["record_dir"], self.site_url) if settings["record_dir"] else None
+        self.network = NetworkTiming(self.site_url) if settings["network_timing"] else None
+        self.memory = MemoryTelemetry(settings["memory_every_students"]) if settings["memory_every_students"] > 0 else None
+        self.worksheet = ""
+        self.max_actions: int = settings["driver_max_actions"]
+        self.max_rss_mb: float = settings["driver_max_rss_mb"]
+        self.latency_factor: float = settings["driver_latency_factor"]
+        self.profile = profile
+        self.slots = slots
+        self.has_slot = False
+        self.driver: WebDriver | None = None
+        self.actions = 0
+        self.students = 0
+        self.baseline: float | None = None
+        self.recent: deque = deque(maxlen=LATENCY_WINDOW)
+        self.name_threshold: float = settings["name_match_threshold"]
+        self.name_margin: float = settings["name_match_margin"]
+        self.name_index: NameIndex | None = None
+        self.site_names: dict = {}
+        self.unresolved: set = set()
+        self.name_problems: list = []
+        self.commands = CommandCounter()
+        # подтвержденные отправки активности по (ФИО, столбец) для повторов после таймаута
+        self.award_progress: dict = {}
+        self.command_budgets: dict = settings["command_budgets"]
+        self.balances = BalanceReconciler(settings["balance_selector"], settings["award_amounts"]) if settings["balance_selector"] else None
+        # без подтверждений начисления проверяет только сверка, поэтому она должна знать суммы всех столбцов
+        unpriced = [rule["column"] for rule in AWARD_RULES if self.balances is not None and not self.balances.covers(rule)]
+        self.confirm_awards: bool = settings["confirm_awards"] or self.balances is None or bool(unpriced)
+        if not settings["confirm_awards"] and self.confirm_awards:
+            logging.warning("confirm_awards выключен, но сверка балансов %s: подтверждения начислений остаются", f"не знает сумм столбцов {', '.join(unpriced)}" if unpriced else "не настроена")
+
+    def start(self) -> bool:
+        """Запускает браузер, входит на сайт и открывает список пользователей."""
+        if not self.acquire_slot():
+            return False
+        self.driver = init_driver(performance_log=self.recorder is not None or self.network is not None)
+        self.commands.attach(self.driver)
+        if not login_to_site(self.driver, self.login, self.password, self.site_url):
+            self.driver = None
+            self.release_slot()
+            return False
+        open_users_page(self.driver)
+        if self.balances is not None:
+            self.balances.start(self.driver)
+        # запросы входа не относятся ни к одному начислению
+        self.drain_performance_log()
+        self.actions = 0
+        self.baseline = None
+        self.recent.clear()
+        return True
+
+    def acquire_slot(self) -> bool:
+        """Занимает место в общем лимите браузеров; False, если запуск остановлен во время ожидания."""
+        if self.slots is None or self.has_slot:
+            return True
+        if not self.slots.acquire(blocking=False):
+            update_status("Ожидание свободного браузера")
+            while not self.slots.acquire(timeout=1):
+                if stop_event.is_set():
+                    return False
+        self.has_slot = True
+        return True
+
+    def release_slot(self) -> None:
+        if self.has_slot:
+            self.slots.release()
+            self.has_slot = False
+
+    def track(self, started: float, submits: int | None = 1) -> None:
+        """Учитывает длительность одного действия над учеником.
+
+        Для перезапуска по замедлению берется время одной отправки формы:
+        активность отправляет форму submits раз, а поиск, не нашедший ученика
+        (submits=None), формы не отправляет и в среднее не попадает.
+        """
+        latency = time.perf_counter() - started
+        self.drain_performance_log()
+        self.actions += 1
+        if submits is not None:
+            self.recent.append(latency / submits)
+            if self.baseline is None and len(self.recent) == self.recent.maxlen:
+                self.baseline = sum(self.recent) / len(self.recent)
+        self.profile.sample("action", latency=round(latency, 3), actions=self.actions)
+
+    def chrome_rss_mb(self) -> float | None:
+        if self.driver is None or self.driver.service.process is None:
+            return None
+        return process_tree_rss_mb(self.driver.service.process.pid)
+
+    def recycle_reason(self, rss_mb: float | None) -> str | None:
+        """Возвращает причину перезапуска браузера или None, если он не нужен."""
+        if self.actions >= self.max_actions:
+            return f"выполнено {self.actions} действий"
+        if rss_mb is not None and rss_mb >= self.max_rss_mb:
+            return f"Chrome занимает {rss_mb:.0f} МБ"
+        if self.baseline and len(self.recent) == self.recent.maxlen:
+            mean = sum(self.recent) / len(self.recent)
+            if mean >= self.baseline * self.latency_factor:
+                return f"отправка формы замедлилась до {mean:.1f} с"
+        return None
+
+    def checkpoint(self) -> WebDriver:
+        """Безопасная точка между учениками: запускает драйвер при первом обращении и пересоздает его при превышении порогов."""
+        if self.driver is None and not self.start():
+            raise RuntimeError("Не удалось войти на сайт")
+        self.students += 1
+        rss_mb = self.chrome_rss_mb()
+        self.profile.sample(
+            "memory",
+            students=self.students,
+            actions=self.actions,
+            chrome_rss_mb=None if rss_mb is None else round(rss_mb, 1),
         )
-        user_item.find_element(By.TAG_NAME, 'a').click()
+        if self.memory is not None:
+            self.memory.sample(self.students, self.profile)
+        reason = self.recycle_reason(rss_mb)
+        if reason:
+            logging.info("Перезапуск браузера: %s", reason)
+            update_status(f"Перезапуск браузера: {reason}")
+            self.profile.event("recycle", reason=reason, students=self.students)
+            self.quit()
+            if not self.start():
+                raise RuntimeError("Не удалось перезапустить браузер")
+        return self.driver
+
+    def site_name(self, name: str) -> str:
+        """ФИО ученика так, как оно записано на сайте."""
+        return self.site_names.get(name, name)
+
+    def resolve_names(self, table: "SheetTable") -> list:
+        """Сопоставляет ФИО учеников с отметками с пользователями сайта до начислений.
+
+        Индекс пользователей строится один раз за запуск. Однозначные совпадения
+        запоминаются, неоднозначные и ненайденные ФИО возвращаются списком и
+        дальше ищутся на сайте как есть.
+        """
+        pending = []
+        for _, row in table.rows():
+            name = row["фио"]
+            if is_blank(name) or name in self.site_names or name in self.unresolved:
+                continue
+            if any(award_status(rule, row[rule["column"]]) == "due" for rule in AWARD_RULES):
+                pending.append(name)
+        if not pending:
+            return []
+        if self.name_index is None:
+            if self.driver is None and not self.start():
+                raise RuntimeError("Не удалось войти на сайт")
+            self.name_index = NameIndex(read_site_user_names(self.driver), self.name_threshold, self.name_margin)
+            logging.info("Загружен список пользователей сайта: %s", len(self.name_index.names))
+            self.profile.event("name_index", users=len(self.name_index.names))
+        if not self.name_index.names:
+            return []
+        problems = []
+        for name in dict.fromkeys(pending):
+            status, candidates = self.name_index.resolve(name)
+            if status in ("exact", "fuzzy"):
+                self.site_names[name] = candidates[0]
+                if status == "fuzzy":
+                    logging.info("ФИО «%s» сопоставлено с пользователем сайта «%s»", name, candidates[0])
+                continue
+            self.unresolved.add(name)
+            if status == "ambiguous":
+                problems.append(f"{name}: несколько похожих пользователей ({', '.join(candidates)})")
+            else:
+                problems.append(f"{name}: не найден на сайте")
+        self.name_problems += problems
+        return problems
+
+    def save_recording(self) -> None:
+        """Сохраняет запись сайта, затирая логин, пароль и ФИО учеников."""
+        if self.recorder is None:
+            return
+        names = list(self.site_names) + list(self.site_names.values()) + list(self.unresolved)
+        if self.name_index is not None:
+            names += self.name_index.names
+        self.recorder.save([self.login, self.password], names)
+
+    def drain_performance_log(self) -> None:
+        """Передает новые сообщения журнала Chrome записи сайта и сетевым замерам."""
+        if self.driver is None or (self.recorder is None and self.network is None):
+            return
+        messages = read_performance_log(self.driver)
+        if self.recorder is not None:
+            self.recorder.drain(self.driver, messages)
+        if self.network is not None:
+            self.network.drain(messages)
+
+    def check_commands(self, row, rule: dict, commands: dict) -> None:
+        """Пишет число команд WebDriver начисления в профиль и предупреждает о превышении command_budgets.
+
+        Бюджет задается на одну отправку формы, у активности он умножается на число отправок.
+        """
+        total = sum(commands.values())
+        self.profile.sample("commands", student=str(row["фио"]), column=rule["column"], total=total, by_command=commands)
+        budget = self.command_budgets.get(rule["column"], self.command_budgets.get(rule["kind"]))
+        if budget is None:
+            return
+        limit = budget * award_steps(rule, row[rule["column"]])
+        if total > limit:
+            logging.warning("Начисление %s пользователя %s: %s команд WebDriver при бюджете %s", rule["label"], row["фио"], total, limit)
+            self.profile.event("command_budget", student=str(row["фио"]), column=rule["column"], commands=total, budget=limit)
+
+    def report_run(self) -> None:
+        """Сохраняет в профиль итог команд WebDriver, самые медленные адреса сайта и рост памяти бота за запуск."""
+        if self.network is not None:
+            self.network.report(self.profile)
+        if self.memory is not None:
+            self.memory.report(self.profile)
+        self.commands.report(self.profile)
+
+    def quit(self) -> None:
+        if self.driver is not None:
+            self.drain_performance_log()
+            session_options.pop(self.driver.session_id, None)
+            try:
+                self.driver.quit()
+            except Exception as e:
+                logging.error("Ошибка закрытия WebDriver: %s", e)
+            self.driver = None
+        self.release_slot()
+
+
+class AimdLimiter:
+    """Общий для всех сессий регулятор числа одновременных отправок начислений.
+
+    Пока отправки проходят быстро и без ошибок, предел растет на единицу за
+    «окно» из limit отправок; при ошибке или замедлении он умножается на
+    aimd_decrease.
+    """
+
+    def __init__(self) -> None:
+        self.limit = 1.0
+        self.min_limit = 1.0
+        self.max_limit = float(DEFAULT_SETTINGS["aimd_max_limit"])
+        self.decrease = DEFAULT_SETTINGS["aimd_decrease"]
+        self.slow_seconds = DEFAULT_SETTINGS["aimd_slow_seconds"]
+        self.in_flight = 0
+        self.completed: deque = deque()
+        self.condition = threading.Condition()
+
+    def configure(self, settings: dict) -> None:
+        with self.condition:
+            self.max_limit = float(settings["aimd_max_limit"])
+            self.decrease = settings["aimd_decrease"]
+            self.slow_seconds = settings["aimd_slow_seconds"]
+            self.limit = min(self.limit, self.max_limit)
+
+    def acquire(self) -> None:
+        """Ждет свободного места под отправку."""
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency: float, ok: bool) -> None:
+        """Освобождает место и корректирует предел по результату отправки; latency - время одной отправки формы."""
+        with self.condition:
+            self.in_flight -= 1
+            if ok and latency < self.slow_seconds:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            else:
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+            if ok:
+                self.completed.append(time.time())
+            self.condition.notify_all()
+
+    def throughput(self) -> float:
+        """Число успешных отправок за последнюю минуту."""
+        with self.condition:
+            border = time.time() - 60
+            while self.completed and self.completed[0] < border:
+                self.completed.popleft()
+            return float(len(self.completed))
+
+
+site_limiter = AimdLimiter()
+
+class AwardHistory:
+    """Журнал подтвержденных начислений в сжатых CSV, разложенных по папкам date=.../club=....
+
+    Файлы только дописываются, и каждый процесс пишет в свои файлы, поэтому
+    папку истории можно сделать общей для нескольких машин. Записи копятся в
+    памяти и сбрасываются на диск пачками по history_flush_rows и в конце запуска.
+    """
+
+    def __init__(self) -> None:
+        self.directory: str = DEFAULT_SETTINGS["history_dir"]
+        self.flush_rows: int = DEFAULT_SETTINGS["history_flush_rows"]
+        self.buffer: list = []
+        self.lock = threading.Lock()
+
+    def configure(self, settings: dict) -> None:
+        self.directory = settings["history_dir"]
+        self.flush_rows = settings["history_flush_rows"]
+
+    def record(self, club: str, worksheet: str, student, rule: dict, value) -> None:
+        with self.lock:
+            self.buffer.append([time.strftime("%Y-%m-%d %H:%M:%S"), club, worksheet, str(student), rule["column"], rule["kind"], value])
+            full = len(self.buffer) >= self.flush_rows
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        """Дописывает накопленные записи в файлы своих разделов."""
+        with self.lock:
+            rows, self.buffer = self.buffer, []
+            partitions: dict = {}
+            for row in rows:
+                partitions.setdefault((row[0][:10], safe_name(row[1])), []).append(row)
+            try:
+                for (date, club), part in partitions.items():
+                    directory = os.path.join(self.directory, f"date={date}", f"club={club}")
+                    os.makedirs(directory, exist_ok=True)
+                    path = os.path.join(directory, f"{safe_name(worker_name())}.csv.gz")
+                    header = not os.path.exists(path)
+                    with gzip.open(path, "at", encoding="utf-8", newline="") as file:
+                        writer = csv.writer(file)
+                        if header:
+                            writer.writerow(HISTORY_COLUMNS)
+                        writer.writerows(part)
+            except OSError as e:
+                logging.error("Ошибка записи истории начислений: %s", e)
+
+
+award_history = AwardHistory()
+
+
+def read_history(directory: str, since: str | None = None, until: str | None = None, club: str | None = None):
+    """Перебирает записи истории; папки вне диапазона дат (ГГГГ-ММ-ДД) и других клубов не читаются."""
+    if not os.path.isdir(directory):
+        return
+    for date_folder in sorted(os.listdir(directory)):
+        date = date_folder.removeprefix("date=")
+        if (since and date < since) or (until and date > until):
+            continue
+        for club_folder in sorted(os.listdir(os.path.join(directory, date_folder))):
+            if club and club_folder != f"club={safe_name(club)}":
+                continue
+            folder = os.path.join(directory, date_folder, club_folder)
+            for name in sorted(os.listdir(folder)):
+                if name.endswith(".csv.gz"):
+                    with gzip.open(os.path.join(folder, name), "rt", encoding="utf-8", newline="") as file:
+                        yield from csv.DictReader(file)
+
+
+def aggregate_history(directory: str, group_by: tuple = ("club", "column"), since: str | None = None, until: str | None = None, club: str | None = None) -> dict:
+    """Считает начисления по группам: {("Клуб 1", "дз"): {"awards": 12, "value": 12.0}}.
+
+    Поля группировки - столбцы истории и month (ГГГГ-ММ); value - сумма чисел из
+    ячеек, отметка «да» считается за 1.
+    """
+    totals: dict = {}
+    for record in read_history(directory, since, until, club):
+        record["month"] = record["time"][:7]
+        total = totals.setdefault(tuple(record[field] for field in group_by), {"awards": 0, "value": 0.0})
+        total["awards"] += 1
+        total["value"] += float(record["value"]) if is_number(record["value"]) else 1
+    return totals
+
+
+def print_history_report(directory: str, since: str | None, until: str | None, club: str | None) -> None:
+    """Печатает итоги истории по клубам, месяцам и столбцам."""
+    totals = aggregate_history(directory, ("club", "month", "column"), since, until, club)
+    if not totals:
+        print("История начислений пуста")
+        return
+    for (club_name, month, column), total in sorted(totals.items()):
+        print(f"{club_name}\t{month}\t{column}\t{total['awards']}\t{total['value']:g}")
+
+
+class ActionCosts:
+    """Оценки длительности начислений по столбцам, накопленные за прошлые запуски.
+
+    Хранится скользящее среднее времени одного шага: у активности шагов столько,
+    сколько раз по 5 киберонов, у остальных столбцов - один.
+    """
+
+    def __init__(self) -> None:
+        self.costs: dict = {}
+        self.lock = threading.Lock()
+
+    def load(self) -> None:
+        try:
+            if os.path.exists(COSTS_FILE):
+                with open(COSTS_FILE, "r", encoding="utf-8") as file:
+                    with self.lock:
+                        self.costs = json.load(file)
+        except Exception as e:
+            logging.warning("Не удалось загрузить оценки длительности начислений: %s", e)
+
+    def save(self) -> None:
+        try:
+            with self.lock:
+                with open(COSTS_FILE, "w", encoding="utf-8") as file:
+                    json.dump(self.costs, file, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logging.warning("Не удалось сохранить оценки длительности начислений: %s", e)
+
+    def estimate(self, rule: dict, value) -> float:
+        """Ожидаемая длительность начисления в секундах."""
+        with self.lock:
+            step = self.costs.get(rule["column"], DEFAULT_STEP_SECONDS)
+        return step * award_steps(rule, value)
+
+    def observe(self, rule: dict, value, seconds: float) -> None:
+        step = seconds / award_steps(rule, value)
+        with self.lock:
+            previous = self.costs.get(rule["column"])
+            self.costs[rule["column"]] = round(step if previous is None else previous + COST_SMOOTHING * (step - previous), 3)
+
+
+action_costs = ActionCosts()
+
+
+# Шаги текущего начисления потока для сетевых замеров: список (шаг, секунды) или None
+span_context = threading.local()
+
+
+class RunMetrics:
+    """Счетчики текущего запуска для панели в окне: сделанные и оставшиеся начисления, скорость и длительность шагов.
+
+    Рабочие потоки только добавляют значения под блокировкой, панель забирает
+    снимок из потока окна раз в DASHBOARD_REFRESH_MS.
+    """
+
+    STEPS = {"search": "Поиск", "modal": "Форма", "writeback": "Запись"}
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.started = time.monotonic()
+            self.planned = 0
+            self.done = 0
+            self.failed = 0
+            self.skipped = 0
+            self.wasted = 0.0
+            self.finished: deque = deque()
+            self.steps = {step: deque(maxlen=STEP_SAMPLES) for step in self.STEPS}
+
+    def plan(self, count: int) -> None:
+        with self.lock:
+            self.planned += count
+
+    def skip(self, count: int = 1) -> None:
+        """Начисления из плана, которые в этом запуске выполняться не будут."""
+        with self.lock:
+            self.skipped += count
+
+    def waste(self, seconds: float) -> None:
+        """Время неудачных попыток и пауз, ушедшее без результата."""
+        with self.lock:
+            self.wasted += seconds
+
+    def finish(self, ok: bool, count: int = 1) -> None:
+        now = time.monotonic()
+        with self.lock:
+            if ok:
+                self.done += count
+                self.finished.extend([now] * count)
+            else:
+                self.failed += count
+
+    @contextmanager
+    def timed(self, step: str):
+        """Замеряет длительность шага search, modal или writeback."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            with self.lock:
+                self.steps[step].append(seconds)
+            spans = getattr(span_context, "spans", None)
+            if spans is not None:
+                spans.append((step, seconds))
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self.lock:
+            while self.finished and now - self.finished[0] > RATE_WINDOW_SECONDS:
+                self.finished.popleft()
+            window = min(RATE_WINDOW_SECONDS, now - self.started)
+            per_minute = len(self.finished) * 60 / window if window > 0 else 0.0
+            remaining = max(self.planned - self.done - self.failed - self.skipped, 0)
+            return {
+                "planned": self.planned,
+                "done": self.done,
+                "failed": self.failed,
+                "wasted": self.wasted,
+                "remaining": remaining,
+                "per_minute": per_minute,
+                "eta": remaining * 60 / per_minute if per_minute else None,
+                "steps": {step: list(values) for step, values in self.steps.items()},
+            }
+
+
+run_metrics = RunMetrics()
+
+
+def sheets_quota_usage() -> tuple:
+    """Запросы к Google Sheets за последнюю минуту и лимит, суммарно по всем сервисным аккаунтам."""
+    with sheets_quotas_lock:
+        quotas = list(sheets_quotas.values())
+    return sum(quota.used() for quota in quotas), sum(quota.per_minute for quota in quotas)
+
+
+def format_dashboard(snapshot: dict, quota: tuple) -> str:
+    """Текст панели запуска."""
+    lines = [f"Выполнено {snapshot['done']} из {snapshot['planned']}, осталось {snapshot['remaining']}, ошибок {snapshot['failed']} (потеряно {snapshot['wasted']:.0f} с)"]
+    eta = snapshot["eta"]
+    if eta is None:
+        lines.append(f"Скорость {snapshot['per_minute']:.1f} в минуту")
+    else:
+        minutes, seconds = divmod(int(eta), 60)
+        lines.append(f"Скорость {snapshot['per_minute']:.1f} в минуту, до конца ~{minutes} мин {seconds:02d} с")
+    for step, title in RunMetrics.STEPS.items():
+        values = snapshot["steps"][step]
+        last = f"{values[-1]:.1f} с" if values else "-"
+        lines.append(f"{title:<7}{render_sparkline(values, STEP_SAMPLES):<{STEP_SAMPLES}} {last}")
+    used, limit = quota
+    lines.append(f"Google Sheets: {used} из {limit} запросов в минуту" if limit else "Google Sheets: -")
+    return "\n".join(lines)
+
+
+# Префикс строки состояния для потока клуба при обработке нескольких клубов
+status_context = threading.local()
+
+# Счетчики пропущенных ячеек листа, который обрабатывает поток: {(столбец, значение): число}
+skip_context = threading.local()
+
+
+def count_skip(column: str, value) -> None:
+    """Учитывает пропущенную ячейку вместо отдельной строки журнала на каждую."""
+    counts = getattr(skip_context, "counts", None)
+    if counts is None:
+        counts = skip_context.counts = {}
+    key = (column, "пусто" if is_blank(value) else str(value))
+    counts[key] = counts.get(key, 0) + 1
+
+
+def report_skips(profile: RunProfile) -> None:
+    """Пишет в журнал и профиль итог пропусков потока и обнуляет счетчики."""
+    counts = getattr(skip_context, "counts", None)
+    skip_context.counts = {}
+    if not counts:
+        return
+    summary = {f"{column}: {value}": count for (column, value), count in sorted(counts.items())}
+    logging.info("Пропущено ячеек: %s", ", ".join(f"{key} - {count}" for key, count in summary.items()))
+    profile.event("skipped", counts=summary)
+
+
+def normalize_name(name) -> str:
+    """Приводит ФИО к виду для сравнения: нижний регистр, е вместо ё, одиночные пробелы."""
+    return " ".join(str(name).lower().replace("ё", "е").split())
+
+
+def name_key(name) -> str:
+    """Ключ ФИО без учета регистра, ё/е, лишних пробелов и порядка слов."""
+    return " ".join(sorted(normalize_name(name).split()))
+
+
+def name_trigrams(key: str) -> set:
+    """Триграммы каждого слова по отдельности, чтобы порядок слов не влиял на сходство."""
+    grams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def within_one_edit(first: str, second: str) -> bool:
+    """Слова отличаются не больше чем одной заменой, вставкой или удалением буквы.
+
+    Короткие слова должны совпадать точно: «Маша» и «Саша» - разные имена.
+    """
+    if first == second:
         return True
+    if min(len(first), len(second)) < FUZZY_WORD_MIN or abs(len(first) - len(second)) > 1:
+        return False
+    if len(first) > len(second):
+        first, second = second, first
+    position = 0
+    while position < len(first) and first[position] == second[position]:
+        position += 1
+    if len(first) == len(second):
+        return first[position + 1 :] == second[position + 1 :]
+    return first[position:] == second[position + 1 :]
+
+
+def same_person(first_key: str, second_key: str) -> bool:
+    """Каждое слово одного ФИО совпадает со своим словом другого с точностью до одной опечатки.
 
-    except (NoSuchElementException, TimeoutException):
+    Общая фамилия при другом имени - другой ученик, даже если триграммы близки.
+    """
+    first, second = first_key.split(), second_key.split()
+    if len(first) != len(second):
+        return False
+    return any(all(within_one_edit(word, other) for word, other in zip(first, order)) for order in permutations(second))
+
+
+class NameIndex:
+    """Индекс ФИО пользователей сайта: точное совпадение по ключу, иначе сходство по триграммам."""
+
+    def __init__(self, names: list, threshold: float, margin: float) -> None:
+        self.names = list(dict.fromkeys(name for name in names if not is_blank(name)))
+        self.threshold = threshold
+        self.margin = margin
+        self.by_key: dict = {}
+        self.keys: list = []
+        self.sizes: list = []
+        self.postings: dict = {}
+        for position, name in enumerate(self.names):
+            key = name_key(name)
+            self.by_key.setdefault(key, []).append(name)
+            self.keys.append(key)
+            grams = name_trigrams(key)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(position)
+
+    def resolve(self, name) -> tuple:
+        """Возвращает (статус, кандидаты); статус: exact, fuzzy, ambiguous или missing.
+
+        Похожими считаются только ФИО, у которых каждое слово совпадает с точностью до одной опечатки.
+        """
+        key = name_key(name)
+        exact = self.by_key.get(key, [])
+        if exact:
+            return ("exact" if len(exact) == 1 else "ambiguous"), exact
+        if len(key.split()) < 2:
+            return "missing", []
+        grams = name_trigrams(key)
+        shared: dict = {}
+        for gram in grams:
+            for position in self.postings.get(gram, ()):
+                shared[position] = shared.get(position, 0) + 1
+        # Коэффициент Жаккара по множествам триграмм
+        scores = sorted(
+            ((count / (len(grams) + self.sizes[position] - count), position) for position, count in shared.items()),
+            reverse=True,
+        )
+        scores = [(score, position) for score, position in scores if score >= self.threshold and same_person(key, self.keys[position])]
+        if not scores:
+            return "missing", []
+        close = [self.names[position] for score, position in scores if scores[0][0] - score < self.margin]
+        return ("fuzzy" if len(close) == 1 else "ambiguous"), close
+
+
+def read_site_user_names(driver) -> list:
+    """Читает ФИО всех пользователей из списка на сайте одним запросом."""
+    return driver.execute_script(USER_NAMES_SCRIPT) or []
+
+
+def report_name_problems(problems: list) -> None:
+    """Выводит одним списком ФИО, которые не удалось однозначно сопоставить с сайтом."""
+    if not problems:
+        return
+    logging.warning("Не удалось однозначно сопоставить ФИО с сайтом:\n%s", "\n".join(problems))
+    update_status(f"Не удалось однозначно сопоставить ФИО ({len(problems)}): {'; '.join(problems)}")
+
+
+def search_outcome(name: str):
+    """Условие ожидания для WebDriverWait: результат фильтрации списка пользователей.
+
+    Возвращает список пар (строка, текст ссылки) после того, как фильтр применен
+    к введенному имени; пустой список означает, что пользователь не найден.
+    Пока фильтр может показывать результат прошлого поиска (нет строк или ни одна
+    не содержит имени), результат принимается только на третьем опросе.
+    """
+    query = normalize_name(name)
+    polls = [0]
+
+    def condition(driver):
+        state = driver.execute_script(SEARCH_STATE_SCRIPT)
+        if state is None:
+            return False
+        polls[0] += 1
+        rows = [(element, normalize_name(text)) for element, text in state]
+        if not any(query in text for _, text in rows) and polls[0] < 3:
+            return False
+        return {"rows": rows}
+
+    return condition
+
+
+def find_and_open_user(driver, name: str) -> StepResult:
+    """Функция поиска и открытия профиля пользователя"""
+    try:
+        search_field = WebDriverWait(driver, 10).until(
+            EC.presence_of_element_located((By.XPATH, "/html/body/div[1]/div/div/div/div/div[2]/div[2]/div/div/div[2]/input"))
+        )
+        search_field.clear()
+        search_field.send_keys(name)
+
+        rows = WebDriverWait(driver, 1, poll_frequency=0.1).until(search_outcome(name))["rows"]
+        query = normalize_name(name)
+        exact = [element for element, text in rows if text == query]
+        if len(exact) > 1:
+            return StepResult.AMBIGUOUS
+        if not exact:
+            # строки без точного совпадения ФИО - прошлый результат поиска или другие ученики, открывать их нельзя
+            return StepResult.AMBIGUOUS if any(query in text for _, text in rows) else StepResult.NOT_FOUND
+        exact[0].find_element(By.TAG_NAME, "a").click()
+        return StepResult.OK
+
+    except (selenium_exceptions.NoSuchElementException, selenium_exceptions.TimeoutException):
         update_status("Не удалось найти пользователя или элементы поиска не загрузились")
         logging.error("Не удалось найти пользователя или элементы поиска не загрузились")
-        return False
+        return StepResult.TIMEOUT
+
+
+def report_lookup_failure(row, result: StepResult) -> None:
+    if result is StepResult.NOT_FOUND:
+        message = f"Пользователь не найден: {row['фио']}"
+    elif result is StepResult.AMBIGUOUS:
+        message = f"Найдено несколько пользователей: {row['фио']}"
+    else:
+        message = f"Не удалось найти пользователя: {row['фио']}"
+    logging.info(message)
+    update_status(message)
+
 
+def return_to_users(driver) -> None:
+    """Возвращается из профиля к списку пользователей.
 
-def activity_bonus(driver, row) -> bool:
-    """Обрабатывает пользователя в таблице."""
+    Итог начисления к этому моменту уже известен, поэтому ошибка возврата его не
+    меняет: следующий поиск начнется с новой загрузки страницы.
+    """
     try:
-        if find_and_open_user(driver, row):
-            iter_count = row['конкурсы-активность'] // 5
-            for _ in range(iter_count):
-                apply_bonus(driver, 1)
-            logging.info(f"Кибероны успешно начислены для пользователя: {row['фио']}")
+        driver.back()
+        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, "//*")))
+        driver.refresh()
+    except (selenium_exceptions.NoSuchElementException, selenium_exceptions.TimeoutException) as e:
+        logging.warning("Не удалось вернуться к списку пользователей: %s", e)
+
+
+def activity_bonus(driver, row, name: str, confirm: bool = True, progress: dict | None = None) -> StepResult:
+    """Обрабатывает пользователя в таблице.
+
+    progress["steps"] - число уже подтвержденных отправок по 5 киберонов: при
+    повторе после таймаута отправляются только оставшиеся.
+    """
+    if progress is None:
+        progress = {"steps": 0}
+    try:
+        with run_metrics.timed("search"):
+            found = find_and_open_user(driver, name)
+        if found is not StepResult.OK:
+            report_lookup_failure(row, found)
+            return found
+        iter_count = row["конкурсы-активность"] // 5
+        result = StepResult.OK
+        for step in range(progress["steps"], iter_count):
+            with run_metrics.timed("modal"):
+                # форма открывается заново только после подтверждения предыдущей отправки
+                result = apply_bonus(driver, 1, confirm or step < iter_count - 1)
+            if result is not StepResult.OK:
+                break
+            progress["steps"] = step + 1
+        if result is StepResult.OK:
+            logging.info("Кибероны успешно начислены для пользователя: %s", row["фио"])
             update_status(f"Кибероны успешно начислены для пользователя: {row['фио']}")
-            driver.back()
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, '//*')))
-            driver.refresh()
-            return True
-        else:
-            logging.info(f"Не удалось найти пользователя: {row['фио']}")
-            update_status(f"Не удалось найти пользователя: {row['фио']}")
-            return False
-    except (NoSuchElementException, TimeoutException) as e:
-        logging.error(f"Ошибка при обработке пользователя {row['фио']}: {e}")
-        return False
+        elif progress["steps"]:
+            logging.warning("Пользователю %s начислено %s из %s отправок активности", row["фио"], progress["steps"], iter_count)
+        return_to_users(driver)
+        return result
+    except (selenium_exceptions.NoSuchElementException, selenium_exceptions.TimeoutException) as e:
+        logging.error("Ошибка при обработке пользователя %s: %s", row["фио"], e)
+        return StepResult.TIMEOUT
 
 
-def other_bonus(driver, row, index) -> bool:
+def other_bonus(driver, row, name: str, index, confirm: bool = True) -> StepResult:
     """Обрабатывает остальные бонусы"""
     try:
-        if find_and_open_user(driver, row):
-            apply_bonus(driver, index)
-            logging.info(f"Бонусные кибероны успешно начислены для пользователя: {row['фио']}")
+        with run_metrics.timed("search"):
+            found = find_and_open_user(driver, name)
+        if found is not StepResult.OK:
+            report_lookup_failure(row, found)
+            return found
+        with run_metrics.timed("modal"):
+            result = apply_bonus(driver, index, confirm)
+        if result is StepResult.OK:
+            logging.info("Бонусные кибероны успешно начислены для пользователя: %s", row["фио"])
             update_status(f"Бонусные кибероны успешно начислены для пользователя: {row['фио']}")
-            driver.back()
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, '//*')))
-            driver.refresh()
-            return True
-        else:
-            logging.info(f"Не удалось найти пользователя: {row['фио']}")
-            update_status(f"Не удалось найти пользователя: {row['фио']}")
-            return False
-    except (NoSuchElementException, TimeoutException) as e:
-        logging.error(f"Ошибка при обработке бонуса {row['фио']}: {e}")
-        return False
+        return_to_users(driver)
+        return result
+    except (selenium_exceptions.NoSuchElementException, selenium_exceptions.TimeoutException) as e:
+        logging.error("Ошибка при обработке бонуса %s: %s", row["фио"], e)
+        return StepResult.TIMEOUT
 
 
-def process_penalty(driver, row) -> bool:
+def process_penalty(driver, row, name: str, confirm: bool = True) -> StepResult:
     """Запускает процесс обработки штрафов."""
     try:
-        if find_and_open_user(driver, row):
-            apply_penalty(driver, row)
-            logging.info(f"Штраф успешно начислены для пользователя: {row['фио']}")
+        with run_metrics.timed("search"):
+            found = find_and_open_user(driver, name)
+        if found is not StepResult.OK:
+            report_lookup_failure(row, found)
+            return found
+        with run_metrics.timed("modal"):
+            result = apply_penalty(driver, row, confirm)
+        if result is StepResult.OK:
+            logging.info("Штраф успешно начислены для пользователя: %s", row["фио"])
             update_status(f"Штраф успешно начислены для пользователя: {row['фио']}")
-            driver.back()
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, '//*')))
-            driver.refresh()
-            return True
-        else:
-            logging.info(f"Не удалось найти пользователя: {row['фио']}")
-            update_status(f"Не удалось найти пользователя: {row['фио']}")
-            return False
-    except (NoSuchElementException, TimeoutException) as e:
-        logging.error(f"Ошибка при обработке пользователя {row['фио']}: {e}")
+        return_to_users(driver)
+        return result
+    except (selenium_exceptions.NoSuchElementException, selenium_exceptions.TimeoutException) as e:
+        logging.error("Ошибка при обработке пользователя %s: %s", row["фио"], e)
+        return StepResult.TIMEOUT
+
+
+def wait_submit_outcome(driver) -> StepResult:
+    """Ждет подтверждения отправки формы или сообщения об ошибке в модальном окне.
+
+    Форма к этому моменту уже отправлена, поэтому без ответа итог - UNCONFIRMED:
+    сайт мог принять начисление, и повторять его нельзя.
+    """
+    try:
+        WebDriverWait(driver, 10).until(
+            EC.any_of(
+                EC.presence_of_element_located((By.CLASS_NAME, "uss_modal_close")),
+                EC.visibility_of_element_located((By.CSS_SELECTOR, MODAL_ERROR_SELECTOR)),
+            )
+        )
+    except selenium_exceptions.TimeoutException:
+        return StepResult.UNCONFIRMED
+    errors = [element.text for element in driver.find_elements(By.CSS_SELECTOR, MODAL_ERROR_SELECTOR) if element.is_displayed()]
+    if errors:
+        logging.error("Сайт отклонил начисление: %s", "; ".join(errors))
+        return StepResult.REJECTED
+    return StepResult.OK
+
+
+class FormOptions:
+    """Значения пунктов списков формы начисления, прочитанные один раз за сессию сайта.
+
+    signs - вид операции по тексту («Начисление», «Списание»), causes - пункты
+    причины по порядку, как их нумеруют правила AWARD_RULES.
+    """
+
+    def __init__(self) -> None:
+        self.signs: dict = {}
+        self.causes: list = []
+
+    def cause_value(self, index: int) -> str | None:
+        return self.causes[index][0] if 0 <= index < len(self.causes) else None
+
+
+# Карты пунктов по id сессии WebDriver: после перезапуска браузера читаются заново
+session_options: dict = {}
+
+
+def session_form_options(driver) -> FormOptions:
+    return session_options.setdefault(driver.session_id, FormOptions())
+
+
+def read_select_options(driver, element) -> list:
+    return [tuple(option) for option in driver.execute_script(SELECT_OPTIONS_SCRIPT, element) or []]
+
+
+def set_select_value(driver, element, value: str | None) -> bool:
+    if value is None:
         return False
+    return bool(driver.execute_script(SET_SELECT_SCRIPT, element, value))
+
+
+def choose_sign(driver, element, text: str) -> None:
+    """Выбирает вид операции по карте сессии; если пункта в карте нет, ищет его по тексту."""
+    options = session_form_options(driver)
+    if not options.signs:
+        options.signs = {label: value for value, label in read_select_options(driver, element)}
+    if not set_select_value(driver, element, options.signs.get(text)):
+        Select(element).select_by_visible_text(text)
 
 
-def apply_bonus(driver, index) -> bool:
+def choose_cause(driver, element, index: int) -> None:
+    """Выбирает причину начисления по карте сессии; если пункта в карте нет, выбирает по индексу."""
+    options = session_form_options(driver)
+    if not options.causes:
+        options.causes = read_select_options(driver, element)
+        logging.info("Причины начисления на сайте: %s", "; ".join((f"{position}: {text}" for position, (_, text) in enumerate(options.causes))))
+    if not set_select_value(driver, element, options.cause_value(index)):
+        Select(element).select_by_index(index)
+
+
+def apply_bonus(driver, index, confirm: bool = True) -> StepResult:
+    submitted = False
     try:
-        button_change_kiberons = driver.find_element(By.XPATH,
-                                                     '/html/body/div[1]/div/div/div/div/div[2]/div[2]/div/div/div[1]/div[1]/span/span')
+        button_change_kiberons = driver.find_element(
+            By.XPATH,
+            "/html/body/div[1]/div/div/div/div/div[2]/div[2]/div/div/div[1]/div[1]/span/span",
+        )
         button_change_kiberons.click()
 
-        select1 = Select(
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "fc_field_sign_id"))))
-        select1.select_by_visible_text("Начисление")
+        sign = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "fc_field_sign_id")))
+        choose_sign(driver, sign, "Начисление")
 
-        select2 = Select(
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "fc_field_cause_id"))))
-        select2.select_by_index(index)
+        cause = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "fc_field_cause_id")))
+        choose_cause(driver, cause, index)
 
         save_button = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.NAME, "sendsave")))
+        # ошибка самого нажатия тоже считается отправкой: форма могла уйти на сайт
+        submitted = True
         save_button.click()
-
-        close_modal_element = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME, "uss_modal_close")))
-        close_modal_element.click()
-
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, '//*')))
-        return True
-    except (NoSuchElementException, TimeoutException) as e:
-        logging.error(f"Ошибка при начислении бонуса: {e}")
-        return False
+        if not confirm:
+            return StepResult.OK
+
+        result = wait_submit_outcome(driver)
+        if result is not StepResult.OK:
+            return result
+    except (selenium_exceptions.NoSuchElementException, selenium_exceptions.TimeoutException) as e:
+        logging.error("Ошибка при начислении бонуса: %s", e)
+        return StepResult.UNCONFIRMED if submitted else StepResult.TIMEOUT
+    # начисление подтверждено: ошибка при закрытии окна его уже не отменяет
+    try:
+        driver.find_element(By.CLASS_NAME, "uss_modal_close").click()
+        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, "//*")))
+    except (selenium_exceptions.NoSuchElementException, selenium_exceptions.TimeoutException) as e:
+        logging.warning("Не удалось закрыть окно начисления: %s", e)
+    return StepResult.OK
 
 
-def apply_penalty(driver, row) -> bool:
+def apply_penalty(driver, row, confirm: bool = True) -> StepResult:
     """Запускает процесс обработки штрафов."""
+    submitted = False
     try:
-        button_change_kiberons = driver.find_element(By.XPATH,
-                                                     '/html/body/div[1]/div/div/div/div/div[2]/div[2]/div/div/div[1]/div[1]/span/span')
+        button_change_kiberons = driver.find_element(
+            By.XPATH,
+            "/html/body/div[1]/div/div/div/div/div[2]/div[2]/div/div/div[1]/div[1]/span/span",
+        )
         button_change_kiberons.click()
-        select1 = Select(
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "fc_field_sign_id"))))
-        select1.select_by_visible_text("Списание")
+        sign = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.ID, "fc_field_sign_id")))
+        choose_sign(driver, sign, "Списание")
         field_comment = driver.find_element(By.ID, "fc_field_comment_id")
         field_comment.clear()
         field_comment.send_keys("Замечания по поведению")
         field_amount = driver.find_element(By.ID, "fc_field_amount_id")
         field_amount.clear()
-        field_amount.send_keys(int(row['штраф']))
+        field_amount.send_keys(int(row["штраф"]))
         save_button = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.NAME, "sendsave")))
+        submitted = True
         save_button.click()
-        return True
-    except (NoSuchElementException, TimeoutException) as e:
-        logging.error(f"Ошибка при взыскании штрафа: {e}")
+        return wait_submit_outcome(driver) if confirm else StepResult.OK
+    except (selenium_exceptions.NoSuchElementException, selenium_exceptions.TimeoutException) as e:
+        logging.error("Ошибка при взыскании штрафа: %s", e)
+        return StepResult.UNCONFIRMED if submitted else StepResult.TIMEOUT
+
+
+def award_status(rule: dict, value) -> str:
+    """Классифицирует ячейку правила: due, empty, skip или invalid."""
+    if is_blank(value):
+        return "empty"
+    if rule["kind"] == "bonus":
+        return "due" if str(value) == "да" else "skip"
+    try:
+        return "due" if float(value) > 0 else "skip"
+    except ValueError:
+        return "invalid"
+
+
+def is_number(value) -> bool:
+    try:
+        float(value)
+    except (TypeError, ValueError):
         return False
+    return True
 
 
-def start_processing() -> None:
-    """Основная логика обработки данных."""
-    save_credentials()
-    driver: WebDriver | None = None
+class SheetValidator:
+    """Проверка листа до запуска браузера: столбцы, значения отметок и повторяющиеся ФИО.
+
+    Столбцы проверяются целиком; индекс ФИО хранится между вызовами check,
+    поэтому при потоковой загрузке повторы находятся и в разных порциях.
+    """
+
+    def __init__(self) -> None:
+        self.names: dict = {}
+
+    def check(self, table: SheetTable) -> list:
+        """Возвращает список всех найденных ошибок; пустой список, если лист в порядке."""
+        required = ["фио"] + [rule["column"] for rule in AWARD_RULES]
+        missing = [column for column in required if column not in table.positions]
+        if missing:
+            return [f"В листе нет столбцов: {', '.join(missing)}"]
+        problems = []
+        for rule in AWARD_RULES:
+            column = rule["column"]
+            values = table.data[table.positions[column]]
+            if rule["kind"] == "bonus":
+                bad = [(index, value) for index, value in zip(table.index, values) if not is_blank(value) and value != "да"]
+                expected = "«да» или пустая ячейка"
+            else:
+                bad = [(index, value) for index, value in zip(table.index, values) if not is_blank(value) and not is_number(value)]
+                expected = "число"
+            problems += [f"Строка {index + 2}, {column}: «{value}», ожидается {expected}" for index, value in bad]
+        for index, name in zip(table.index, table.data[table.positions["фио"]]):
+            if is_blank(name):
+                continue
+            first = self.names.setdefault(name_key(name), index)
+            if first != index:
+                problems.append(f"Строка {index + 2}: ФИО «{name}» повторяет строку {first + 2}")
+        return problems
+
+
+def validate_sheet(validator: SheetValidator, table: SheetTable) -> None:
+    """Проверяет лист и прерывает запуск со списком всех ошибок."""
+    started = time.perf_counter()
+    problems = validator.check(table)
+    logging.info("Проверка листа: %s строк за %.0f мс", len(table), (time.perf_counter() - started) * 1000)
+    raise_sheet_problems(problems)
+
+
+def validate_stream(google_sheet: GoogleSheet, chunk_rows: int) -> list:
+    """Проверяет большой лист целиком до первого начисления, читая его порциями, и возвращает проверенные порции.
+
+    Начисления идут по этим же порциям, поэтому лист читается один раз, а ошибка в
+    последней порции находится до первого начисления, а не после оплаты предыдущих.
+    """
+    started = time.perf_counter()
+    validator = SheetValidator()
+    problems = []
+    chunks = []
+    for chunk in google_sheet.iter_data_chunks(chunk_rows):
+        problems += validator.check(chunk)
+        chunks.append(chunk)
+    logging.info("Проверка листа порциями: %s строк за %.0f мс", sum(len(chunk) for chunk in chunks), (time.perf_counter() - started) * 1000)
+    raise_sheet_problems(problems)
+    return chunks
+
+
+def raise_sheet_problems(problems: list) -> None:
+    """Прерывает запуск со списком всех ошибок листа, если они есть."""
+    if not problems:
+        return
+    logging.error("Ошибки в таблице:\n%s", "\n".join(problems))
+    shown = "\n".join(problems[:20])
+    if len(problems) > 20:
+        shown += f"\n... и еще {len(problems) - 20}"
+    raise ValueError(f"в таблице {len(problems)} ошибок, начисления не выполнялись:\n{shown}")
+
+
+def has_pending_awards(table: SheetTable) -> bool:
+    """Проверяет, есть ли в таблице хотя бы одна отметка для начисления."""
+    for _, row in table.rows():
+        if not is_blank(row["фио"]) and any(
+            award_status(rule, row[rule["column"]]) == "due" for rule in AWARD_RULES
+        ):
+            return True
+    return False
+
+
+def count_due_awards(table: SheetTable) -> int:
+    """Число отметок для начисления в таблице, без записи пропусков в журнал."""
+    return sum(1 for _, row in table.rows() if not is_blank(row["фио"]) for rule in AWARD_RULES if award_status(rule, row[rule["column"]]) == "due")
+
+
+def is_award_due(rule: dict, row) -> bool:
+    """Проверяет, нужно ли начисление по ячейке правила."""
+    column = rule["column"]
+    value = row[column]
+    status = award_status(rule, value)
+    if status in ("empty", "skip"):
+        count_skip(column, value)
+    elif status == "invalid":
+        logging.warning("Неверное значение %s для пользователя %s: %s", column, row["фио"], value)
+        update_status(f"Неверное значение {column} для пользователя {row['фио']}: {value}")
+    return status == "due"
+
+
+def run_award(driver, row, rule: dict, name: str, confirm: bool = True, progress: dict | None = None) -> StepResult:
+    """Выполняет начисление или списание по правилу; name - ФИО ученика так, как оно записано на сайте.
+
+    С confirm=False последняя отправка формы не ждет подтверждения сайта: результат проверяет сверка балансов.
+    progress - подтвержденные отправки активности, общие для повторов одного начисления.
+    """
+    if rule["kind"] == "activity":
+        return activity_bonus(driver, row, name, confirm, progress)
+    if rule["kind"] == "penalty":
+        return process_penalty(driver, row, name, confirm)
+    return other_bonus(driver, row, name, rule["cause"], confirm)
+
+
+def apply_rule(supervisor: DriverSupervisor, driver, row, rule: dict, confirm: bool | None = None) -> StepResult:
+    """Начисляет по одному правилу с логированием и учетом времени действия; confirm заменяет confirm_awards супервизора."""
+    logging.info("Начинается начисление %s для пользователя: %s", rule["label"], row["фио"])
+    update_status(f"Начинается начисление {rule['label']} для пользователя: {row['фио']}")
+    site_limiter.acquire()
+    spans = span_context.spans = []
+    key = (str(row["фио"]), rule["column"])
+    progress = supervisor.award_progress.setdefault(key, {"steps": 0})
+    resumed = progress["steps"]
+    started = time.perf_counter()
+    result = StepResult.TIMEOUT
     try:
-        update_status("Начинается обработка данных...")
-        google_sheet = GoogleSheet(google_credentials_file, spreadsheet_url, worksheet_name)
+        with supervisor.commands.scope() as commands:
+            result = run_award(driver, row, rule, supervisor.site_name(row["фио"]), supervisor.confirm_awards if confirm is None else confirm, progress)
+    finally:
+        # регулятор оценивает одну отправку формы, а активность отправляет ее по разу на каждые 5 киберонов
+        submits = max(progress["steps"] - resumed, 1)
+        site_limiter.release((time.perf_counter() - started) / submits, result not in (StepResult.TIMEOUT, StepResult.UNCONFIRMED))
+        span_context.spans = None
+    if result is not StepResult.TIMEOUT:
+        supervisor.award_progress.pop(key, None)
+    if result is StepResult.OK:
+        award_history.record(supervisor.club, supervisor.worksheet, row["фио"], rule, row[rule["column"]])
+        action_costs.observe(rule, row[rule["column"]], time.perf_counter() - started)
+        if supervisor.balances is not None:
+            supervisor.balances.expect(supervisor.site_name(row["фио"]), row, rule, supervisor.confirm_awards if confirm is None else confirm)
+    run_metrics.finish(result is StepResult.OK)
+    supervisor.track(started, None if result in (StepResult.NOT_FOUND, StepResult.AMBIGUOUS) else submits)
+    supervisor.check_commands(row, rule, commands)
+    if supervisor.network is not None:
+        supervisor.network.award(rule["column"], time.perf_counter() - started, spans, supervisor.profile)
+    supervisor.profile.sample(
+        "aimd",
+        limit=round(site_limiter.limit, 2),
+        in_flight=site_limiter.in_flight,
+        throughput=site_limiter.throughput(),
+    )
+    if result is not StepResult.OK:
+        run_metrics.waste(time.perf_counter() - started)
+        supervisor.profile.event("award_failed", result=result.value, student=str(row["фио"]), column=rule["column"])
+        if result is StepResult.UNCONFIRMED:
+            logging.warning("Начисление %s пользователю %s отправлено, но сайт его не подтвердил: проверьте баланс, отметка оставлена в таблице", rule["label"], row["фио"])
+        else:
+            logging.warning("Не удалось обработать начисление %s пользователя: %s", rule["label"], row["фио"])
+        update_status(f"Не удалось обработать начисление {rule['label']} пользователя: {row['фио']}")
+    return result
 
-        df = google_sheet.load_data_from_google_sheet()
 
-        if df is None:
-            raise ValueError("No data loaded from Google Sheet")
+def pending_marks(table: SheetTable) -> dict:
+    """Возвращает отметки к начислению: {(фио, столбец): (индекс строки, значение)}."""
+    marks = {}
+    for index, row in table.rows():
+        if is_blank(row["фио"]):
+            continue
+        for rule in AWARD_RULES:
+            value = row[rule["column"]]
+            if award_status(rule, value) == "due":
+                marks[(row["фио"], rule["column"])] = (index, value)
+    return marks
 
-        driver: WebDriver = init_driver()
 
-        login: str = login_entry.get()
-        password: str = password_entry.get()
+def watch_sheet(google_sheet: GoogleSheet, supervisor: DriverSupervisor, interval: float) -> None:
+    """Опрашивает лист и начисляет только отметки, появившиеся с прошлого опроса.
+
+    Неудачные отметки остаются в листе и повторяются, только если учитель изменит ячейку.
+    """
+    previous: dict = {}
+    while not stop_event.is_set():
+        table = google_sheet.load_data_from_google_sheet()
+        problems = SheetValidator().check(table)
+        if problems:
+            logging.warning("Ошибки в таблице:\n%s", "\n".join(problems))
+            update_status(f"В таблице ошибок: {len(problems)}, начисления ждут исправления. {problems[0]}")
+            stop_event.wait(interval)
+            continue
+        current = pending_marks(table)
+        report_name_problems(supervisor.resolve_names(table))
+        new_marks = [key for key, (_, value) in current.items() if previous.get(key) != value]
+        cleared = []
+        try:
+            for student in dict.fromkeys(name for name, _ in new_marks):
+                if stop_event.is_set():
+                    break
+                driver = supervisor.checkpoint()
+                for name, column in new_marks:
+                    if name != student:
+                        continue
+                    index, _ = current[(name, column)]
+                    if apply_rule(supervisor, driver, table.row(index), RULES_BY_COLUMN[column]) is StepResult.OK:
+                        cleared.append((name, column))
+        finally:
+            # подтвержденные начисления очищаются и при ошибке посреди опроса, иначе следующий опрос или запуск начислит их повторно
+            if cleared:
+                google_sheet.clear_cells(table, [(current[key][0], key[1]) for key in cleared])
+        previous = {key: value for key, (_, value) in current.items() if key not in cleared}
+        if not new_marks:
+            update_status(f"Режим наблюдения: новых отметок нет ({time.strftime('%H:%M:%S')})")
+        stop_event.wait(interval)
+    logging.info("Режим наблюдения остановлен")
+    update_status("Режим наблюдения остановлен")
+
+
+class FailureBreaker:
+    """Откладывает неудачные начисления и размыкает цепь при повторяющихся ошибках.
+
+    После student_failure_limit неудач остальные начисления ученика пропускаются
+    (если ученик не найден или найдено несколько, - сразу), после
+    site_failure_limit таймаутов подряд запуск ставится на паузу. В очередь
+    повторов попадают только таймауты до отправки формы: отказ сайта или
+    ненайденное имя повтором не исправить, а неподтвержденную отправку сайт мог
+    принять, и повтор начислил бы дважды.
+    """
 
-        if not login_to_site(driver, login, password):
+    def __init__(self, settings: dict) -> None:
+        self.student_limit: int = settings["student_failure_limit"]
+        self.site_limit: int = settings["site_failure_limit"]
+        self.pause_seconds: float = settings["site_pause_seconds"]
+        self.max_pauses: int = settings["site_max_pauses"]
+        self.failures: dict = {}
+        self.consecutive = 0
+        self.pauses = 0
+        self.deferred: list = []
+        self.rejected: list = []
+        self.unconfirmed: list = []
+        self.unfinished_tasks: list = []
+
+    def is_open(self, student: str) -> bool:
+        return self.failures.get(student, 0) >= self.student_limit
+
+    def record(self, student: str, result: StepResult) -> None:
+        if result is StepResult.OK:
+            self.consecutive = 0
+            return
+        if result in (StepResult.NOT_FOUND, StepResult.AMBIGUOUS):
+            self.failures[student] = max(self.failures.get(student, 0), self.student_limit)
             return
+        self.failures[student] = self.failures.get(student, 0) + 1
+        if result is StepResult.REJECTED:
+            self.rejected.append(student)
+            return
+        if result is StepResult.UNCONFIRMED:
+            self.unconfirmed.append(student)
+        self.consecutive += 1
 
-        link = driver.find_element(By.LINK_TEXT, 'Пользователи')
-        link.click()
-        time.sleep(1)
+    def defer(self, row, index: int, rule: dict, writeback) -> None:
+        """Кладет начисление в очередь повторов конца запуска."""
+        self.deferred.append((row, index, rule, writeback))
 
-        for index, row in df.iterrows():
-            if pd.notna(row["фио"]):
-                if pd.notna(row["конкурсы-активность"]):
-                    try:
-                        kiberones_value: float = float(row["конкурсы-активность"])
-                        if kiberones_value > 0:
-                            logging.info(f"Начинается начисление киберонов для пользователя: {row['фио']}")
-                            update_status(f"Начинается начисление киберонов для пользователя: {row['фио']}")
-                            if activity_bonus(driver, row):
-                                df.at[index, "конкурсы-активность"] = None
-                                google_sheet.save_data_to_google_sheet(df)
-                            else:
-                                logging.warning(f"Не удалось обработать пользователя: {row['фио']}")
-                                update_status(f"Не удалось обработать пользователя: {row['фио']}")
-                        else:
-                            logging.info(f"Пропуск пользователя {row['фио']} с нулевыми или отрицательными киберонами.")
-                    except ValueError:
-                        logging.warning(
-                            f"Неверное значение киберонов для пользователя {row['фио']}: {row['конкурсы-активность']}")
-                        update_status(f"Неверное значение киберонов для пользователя {row['фио']}: {row['конкурсы-активность']}")
-                else:
-                    logging.info(f"Пропуск пользователя {row['фио']} с отсутствующими киберонами.")
-                    update_status(f"Пропуск пользователя {row['фио']} с отсутствующими киберонами.")
-
-
-                if pd.notna(row["посещение"]):
-                    try:
-                        cell_value: str = str(row["посещение"])
-                        if cell_value == "да":
-                            logging.info(f"Начинается начисление за посещение для пользователя: {row['фио']}")
-                            update_status(f"Начинается начисление за посещение для пользователя: {row['фио']}")
-                            if other_bonus(driver, row, 16):
-                                df.at[index, "посещение"] = None
-                                google_sheet.save_data_to_google_sheet(df)
-                            else:
-                                logging.warning(f"Не удалось обработать начисление за посещение пользователя: {row['фио']}")
-                                update_status(f"Не удалось обработать начисление за посещение пользователя: {row['фио']}")
-                        else:
-                            logging.info(f"Пропуск пользователя {row['фио']} с нулевыми или отрицательными посещение.")
-                    except ValueError:
-                        logging.warning(f"Неверное значение посещение для пользователя {row['фио']}: {row['посещение']}")
-                else:
-                    logging.info(f"Пропущена строка: посещение отсутствует (посещение: {row.get('посещение', 'пусто')})")
-                    update_status(f"Пропущена строка: посещение отсутствует (посещение: {row.get('посещение', 'пусто')})")
-
-
-                if pd.notna(row["быстрота"]):
-                    try:
-                        cell_value: str = str(row["быстрота"])
-                        if cell_value == "да":
-                            logging.info(f"Начинается начисление за быстрота для пользователя: {row['фио']}")
-                            update_status(f"Начинается начисление за быстрота для пользователя: {row['фио']}")
-                            if other_bonus(driver, row, 1):
-                                df.at[index, "быстрота"] = None
-                                google_sheet.save_data_to_google_sheet(df)
-                            else:
-                                logging.warning(f"Не удалось обработать начисление за быстрота пользователя: {row['фио']}")
-                                update_status(f"Не удалось обработать начисление за быстрота пользователя: {row['фио']}")
-                        else:
-                            logging.info(f"Пропуск пользователя {row['фио']} с нулевыми или отрицательными быстрота.")
-                    except ValueError:
-                        logging.warning(f"Неверное значение быстрота для пользователя {row['фио']}: {row['быстрота']}")
-                else:
-                    logging.info(f"Пропущена строка: быстрота отсутствует (быстрота: {row.get('быстрота', 'пусто')})")
-                    update_status(f"Пропущена строка: быстрота отсутствует (быстрота: {row.get('быстрота', 'пусто')})")
-
-
-                if pd.notna(row["помощьдругу"]):
-                    try:
-                        cell_value: str = str(row["помощьдругу"])
-                        if cell_value == "да":
-                            logging.info(f"Начинается начисление за помощьдругу для пользователя: {row['фио']}")
-                            update_status(f"Начинается начисление за помощьдругу для пользователя: {row['фио']}")
-                            if other_bonus(driver, row, 4):
-                                df.at[index, "помощьдругу"] = None
-                                google_sheet.save_data_to_google_sheet(df)
-                            else:
-                                logging.warning(f"Не удалось обработать начисление за помощьдругу пользователя: {row['фио']}")
-                                update_status(f"Не удалось обработать начисление за помощьдругу пользователя: {row['фио']}")
-                        else:
-                            logging.info(f"Пропуск пользователя {row['фио']} с нулевыми или отрицательными помощьдругу.")
-                    except ValueError:
-                        logging.warning(f"Неверное значение помощьдругу для пользователя {row['фио']}: {row['помощьдругу']}")
-                else:
-                    logging.info(f"Пропущена строка: помощьдругу отсутствует (помощьдругу: {row.get('помощьдругу', 'пусто')})")
-                    update_status(f"Пропущена строка: помощьдругу отсутствует (помощьдругу: {row.get('помощьдругу', 'пусто')})")
-
-
-                if pd.notna(row["разминка"]):
-                    try:
-                        sport_value: str = str(row["разминка"])
-                        if sport_value == "да":
-                            logging.info(f"Начинается начисление за разминку для пользователя: {row['фио']}")
-                            update_status(f"Начинается начисление за разминку для пользователя: {row['фио']}")
-                            if other_bonus(driver, row, 8):
-                                df.at[index, "разминка"] = None
-                                google_sheet.save_data_to_google_sheet(df)
-                            else:
-                                logging.warning(f"Не удалось обработать начисление за разминку пользователя: {row['фио']}")
-                                update_status(f"Не удалось обработать начисление за разминку пользователя: {row['фио']}")
-                        else:
-                            logging.info(f"Пропуск пользователя {row['фио']} с нулевыми или отрицательными разминка.")
-                    except ValueError:
-                        logging.warning(f"Неверное значение разминка для пользователя {row['фио']}: {row['разминка']}")
-                else:
-                    logging.info(f"Пропущена строка: разминка отсутствует (разминку: {row.get('разминка', 'пусто')})")
-                    update_status(f"Пропущена строка: разминка отсутствует (разминка: {row.get('разминка', 'пусто')})")
-
-                if pd.notna(row["оплата"]):
-                    try:
-                        sport_value: str = str(row["оплата"])
-                        if sport_value == "да":
-                            logging.info(f"Начинается начисление за оплату для пользователя: {row['фио']}")
-                            update_status(f"Начинается начисление за оплату для пользователя: {row['фио']}")
-                            if other_bonus(driver, row, 15):
-                                df.at[index, "оплата"] = None
-                                google_sheet.save_data_to_google_sheet(df)
-                            else:
-                                logging.warning(f"Не удалось обработать начисление за оплату пользователя: {row['фио']}")
-                                update_status(f"Не удалось обработать начисление за оплату пользователя: {row['фио']}")
-                        else:
-                            logging.info(f"Пропуск пользователя {row['фио']} с нулевыми или отрицательными оплата.")
-                    except ValueError:
-                        logging.warning(f"Неверное значение оплата для пользователя {row['фио']}: {row['оплата']}")
-                else:
-                    logging.info(f"Пропущена строка: оплата отсутствует (оплату: {row.get('оплата', 'пусто')})")
-                    update_status(f"Пропущена строка: оплата отсутствует (оплата: {row.get('оплата', 'пусто')})")
-
-                if pd.notna(row["штраф"]):
-                    try:
-                        penalty_value: float = float(row["штраф"])
-                        if penalty_value > 0:
-                            logging.info(f"Начинается начисление штрафа для пользователя: {row['фио']}")
-                            update_status(f"Начинается начисление штрафа для пользователя: {row['фио']}")
-                            if process_penalty(driver, row):
-                                df.at[index, "штраф"] = None
-                                google_sheet.save_data_to_google_sheet(df)
-                            else:
-                                logging.warning(f"Не удалось штраф обработать пользователя: {row['фио']}")
-                                update_status(f"Не удалось штраф обработать пользователя: {row['фио']}")
-                        else:
-                            logging.info(f"Пропуск пользователя {row['фио']} с нулевыми или отрицательными штрафами.")
-                    except ValueError:
-                        logging.warning(f"Неверное значение штрафа для пользователя {row['фио']}: {row['штраф']}")
-                else:
-                    logging.info(f"Пропущена строка: штраф отсутствует (штраф: {row.get('штраф', 'пусто')})")
-                    update_status(f"Пропущена строка: штраф отсутствует (штраф: {row.get('штраф', 'пусто')})")
-
-                if pd.notna(row["дз"]):
-                    try:
-                        homework_value: str = str(row["дз"])
-                        if homework_value == "да":
-                            logging.info(f"Начинается начисление за ДЗ для пользователя: {row['фио']}")
-                            update_status(f"Начинается начисление за ДЗ для пользователя: {row['фио']}")
-                            if other_bonus(driver, row, 10):
-                                df.at[index, "дз"] = None
-                                google_sheet.save_data_to_google_sheet(df)
-                            else:
-                                logging.warning(f"Не удалось обработать начисление за ДЗ пользователя: {row['фио']}")
-                                update_status(f"Не удалось обработать начисление за ДЗ пользователя: {row['фио']}")
-                        else:
-                            logging.info(f"Пропуск пользователя {row['фио']} с нулевыми или отрицательными ДЗ.")
-                    except ValueError:
-                        logging.warning(f"Неверное значение ДЗ для пользователя {row['фио']}: {row['дз']}")
-                else:
-                    logging.info(f"Пропущена строка: ДЗ отсутствует (ДЗ: {row.get('дз', 'пусто')})")
-                    update_status(f"Пропущена строка: ДЗ отсутствует (ДЗ: {row.get('дз', 'пусто')})")
-
-                if pd.notna(row["др"]):
-                    try:
-                        birthday_value: str = str(row["др"])
-                        if birthday_value == "да":
-                            logging.info(f"Начинается начисление за ДР для пользователя: {row['фио']}")
-                            update_status(f"Начинается начисление за ДР для пользователя: {row['фио']}")
-                            if other_bonus(driver, row, 14):
-                                df.at[index, "др"] = None
-                                google_sheet.save_data_to_google_sheet(df)
-                            else:
-                                logging.warning(f"Не удалось обработать начисление за ДР пользователя: {row['фио']}")
-                                update_status(f"Не удалось обработать начисление за ДР пользователя: {row['фио']}")
-                        else:
-                            logging.info(f"Пропуск пользователя {row['фио']} с нулевыми или отрицательными ДЗ.")
-                    except ValueError:
-                        logging.warning(f"Неверное значение ДР для пользователя {row['фио']}: {row['др']}")
-                else:
-                    logging.info(f"Пропущена строка: ДР отсутствует (ДР: {row.get('др', 'пусто')})")
-                    update_status(f"Пропущена строка: ДР отсутствует (ДР: {row.get('др', 'пусто')})")
-
-                if pd.notna(row["бонус пропуск"]):
-                    try:
-                        no_skip_value: str = str(row["бонус пропуск"])
-                        if no_skip_value == "да":
-                            logging.info(
-                                f"Начинается начисление бонуса за модуль без пропуска для пользователя: {row['фио']}")
-                            update_status(
-                                f"Начинается начисление бонуса за модуль без пропуска для пользователя: {row['фио']}")
-                            if other_bonus(driver, row, 5):
-                                df.at[index, "бонус пропуск"] = None
-                                google_sheet.save_data_to_google_sheet(df)
-                            else:
-                                logging.warning(f"Не удалось обработать начисление бонуса за модуль без пропуска пользователя: {row['фио']}")
-                                update_status(f"Не удалось обработать начисление бонуса за модуль без пропуска пользователя: {row['фио']}")
-                        else:
-                            logging.info(f"Пропуск пользователя {row['фио']} с нулевыми или отрицательными бонусами.")
-                    except ValueError:
-                        logging.warning(
-                            f"Неверное значение бонуса для пользователя {row['фио']}: {row['бонус пропуск']}")
-                else:
-                    logging.info(f"Пропущена строка: бонус отсутствует (бонус: {row.get('бонус пропуск', 'пусто')})")
-                    update_status(f"Пропущена строка: бонус отсутствует (бонус: {row.get('бонус пропуск', 'пусто')})")
-
-                if pd.notna(row["бонус поведение"]):
-                    try:
-                        no_penalty_value: str = str(row["бонус поведение"])
-                        if no_penalty_value == "да":
-                            logging.info(
-                                f"Начинается начисление бонуса за модуль без замечаний по поведению для пользователя: {row['фио']}")
-                            update_status(
-                                f"Начинается начисление бонуса за модуль без замечаний по поведению для пользователя: {row['фио']}")
-                            if other_bonus(driver, row, 2):
-                                df.at[index, "бонус поведение"] = None
-                                google_sheet.save_data_to_google_sheet(df)
-                            else:
-                                logging.warning(f"Не удалось обработать начисление бонуса за модуль без замечаний по поведению пользователя: {row['фио']}")
-                                update_status(f"Не удалось обработать начисление бонуса за модуль без замечаний по поведению пользователя: {row['фио']}")
-                        else:
-                            logging.info(f"Пропуск пользователя {row['фио']} с нулевыми или отрицательными бонусами.")
-                    except ValueError:
-                        logging.warning(
-                            f"Неверное значение бонуса для пользователя {row['фио']}: {row['бонус поведение']}")
-                else:
-                    logging.info(f"Пропущена строка: бонус отсутствует (бонус: {row.get('бонус поведение', 'пусто')})")
-                    update_status(f"Пропущена строка: бонус отсутствует (бонус: {row.get('бонус поведение', 'пусто')})")
+    def pause_if_site_down(self, supervisor: DriverSupervisor) -> None:
+        """При серии неудач подряд ждет и начинает новую сессию браузера."""
+        if self.consecutive < self.site_limit:
+            return
+        self.pauses += 1
+        if self.pauses > self.max_pauses:
+            raise RuntimeError(f"Сайт не отвечает: {self.consecutive} неудач подряд")
+        logging.warning("%s неудач подряд, пауза %s с", self.consecutive, self.pause_seconds)
+        update_status(f"{self.consecutive} неудач подряд, пауза {self.pause_seconds} с")
+        supervisor.profile.event("site_pause", failures=self.consecutive)
+        supervisor.quit()
+        paused = time.perf_counter()
+        stop_event.wait(self.pause_seconds)
+        run_metrics.waste(time.perf_counter() - paused)
+        self.consecutive = 0
+
+    def unfinished(self) -> list:
+        """Ученики, у которых остались необработанные отметки."""
+        names = [name for name in self.failures if self.is_open(name)]
+        names += self.rejected
+        names += self.unconfirmed
+        names += self.unfinished_tasks
+        names += [row["фио"] for row, _, _, _ in self.deferred]
+        return list(dict.fromkeys(names))
+
+
+def award_with_breaker(supervisor: DriverSupervisor, breaker: FailureBreaker, driver, row, index: int, rule: dict, writeback) -> bool:
+    """Начисляет по правилу, при таймауте до отправки формы откладывает начисление в очередь повторов."""
+    result = apply_rule(supervisor, driver, row, rule)
+    breaker.record(row["фио"], result)
+    if result is StepResult.TIMEOUT:
+        breaker.defer(row, index, rule, writeback)
+    breaker.pause_if_site_down(supervisor)
+    return result is StepResult.OK
+
+
+def retry_deferred(supervisor: DriverSupervisor, breaker: FailureBreaker, settings: dict, deadline: float | None = None) -> None:
+    """Повторяет отложенные начисления в конце запуска с удваивающейся паузой, но не позже срока deadline."""
+    delay = settings["retry_delay_seconds"]
+
+    def past_deadline() -> bool:
+        return deadline is not None and time.time() >= deadline
+
+    for attempt in range(1, settings["retry_attempts"] + 1):
+        pending = [item for item in breaker.deferred if not breaker.is_open(item[0]["фио"])]
+        if not pending or stop_event.is_set() or past_deadline():
+            return
+        breaker.deferred = [item for item in breaker.deferred if breaker.is_open(item[0]["фио"])]
+        logging.info("Повтор отложенных начислений (%s), попытка %s", len(pending), attempt)
+        update_status(f"Повтор отложенных начислений ({len(pending)}), попытка {attempt}")
+        run_metrics.plan(len(pending))
+        stop_event.wait(delay * 2 ** (attempt - 1))
+        supervisor.quit()
+        for row, index, rule, writeback in pending:
+            if stop_event.is_set() or past_deadline() or breaker.is_open(row["фио"]):
+                breaker.defer(row, index, rule, writeback)
+                run_metrics.skip()
+                continue
+            driver = supervisor.checkpoint()
+            if award_with_breaker(supervisor, breaker, driver, row, index, rule, writeback):
+                writeback([(index, rule["column"])])
+
+
+def award_steps(rule: dict, value) -> int:
+    """Число отправок формы для начисления: активность начисляется по 5 киберонов."""
+    if rule["kind"] == "activity" and is_number(value):
+        return max(int(float(value)) // 5, 1)
+    return 1
+
+
+def award_value(rule: dict, value, settings: dict) -> float:
+    """Ценность начисления для планировщика: вес столбца из award_values, у чисел - умноженный на значение."""
+    weight = settings["award_values"].get(rule["column"], 1)
+    return weight * float(value) if rule["kind"] == "activity" and is_number(value) else weight
+
+
+def run_deadline(settings: dict) -> float | None:
+    """Срок окончания запуска из time_budget_minutes или deadline (ЧЧ:ММ); None - без срока."""
+    if settings["time_budget_minutes"]:
+        return time.time() + settings["time_budget_minutes"] * 60
+    if not settings["deadline"]:
+        return None
+    hours, minutes = (int(part) for part in settings["deadline"].split(":"))
+    now = time.localtime()
+    deadline = time.mktime((now.tm_year, now.tm_mon, now.tm_mday, hours, minutes, 0, 0, 0, -1))
+    if deadline <= time.time():
+        raise ValueError(f"срок {settings['deadline']} уже прошел")
+    return deadline
+
+
+def plan_awards(table: SheetTable, settings: dict) -> list:
+    """Порядок начислений: сначала столбцы priority_columns, затем по ценности на секунду оценки."""
+    actions = []
+    for index, row in table.rows():
+        if is_blank(row["фио"]):
+            continue
+        for rule in AWARD_RULES:
+            value = row[rule["column"]]
+            if award_status(rule, value) != "due":
+                continue
+            actions.append(
+                {
+                    "index": index,
+                    "rule": rule,
+                    "tier": 0 if rule["column"] in settings["priority_columns"] else 1,
+                    "value": award_value(rule, value, settings),
+                    "cost": action_costs.estimate(rule, value),
+                }
+            )
+    actions.sort(key=lambda action: (action["tier"], -action["value"] / action["cost"], action["index"]))
+    return actions
+
+
+def process_scheduled(table: SheetTable, supervisor: DriverSupervisor, breaker: FailureBreaker, writeback, settings: dict, deadline: float) -> bool:
+    """Начисляет по плану приоритетов и не начинает действий, которые по оценке не успеют до срока.
+
+    Невыполненные к сроку отметки остаются в таблице нетронутыми.
+
+    Returns:
+        bool: False, если обработку остановил пользователь.
+    """
+    report_name_problems(supervisor.resolve_names(table))
+    actions = plan_awards(table, settings)
+    run_metrics.plan(len(actions))
+    left = []
+    for action in actions:
+        if stop_event.is_set():
+            logging.info("Обработка остановлена пользователем")
+            update_status("Обработка остановлена пользователем")
+            return False
+        row = table.row(action["index"])
+        if action["cost"] > deadline - time.time():
+            left.append(row["фио"])
+            run_metrics.skip()
+            continue
+        if breaker.is_open(row["фио"]):
+            run_metrics.skip()
+            continue
+        driver = supervisor.checkpoint()
+        if award_with_breaker(supervisor, breaker, driver, row, action["index"], action["rule"], writeback):
+            writeback([(action["index"], action["rule"]["column"])])
+    if left:
+        logging.warning("Не успели к сроку: %s из %s начислений", len(left), len(actions))
+        update_status(f"Не успели к сроку: {len(left)} из {len(actions)} начислений")
+        supervisor.profile.event("deadline", planned=len(actions), left=len(left))
+        breaker.unfinished_tasks += left
+    return True
+
+
+def process_rows(table: SheetTable, supervisor: DriverSupervisor, breaker: FailureBreaker, writeback, deadline: float | None = None) -> bool:
+    """Начисляет по строкам таблицы и после каждого ученика передает очищаемые ячейки в writeback.
+
+    Начисления, которые по оценке не успеют до срока deadline, не начинаются,
+    и их отметки остаются в таблице нетронутыми.
+
+    Returns:
+        bool: False, если обработку остановил пользователь.
+    """
+    report_name_problems(supervisor.resolve_names(table))
+    run_metrics.plan(count_due_awards(table))
+    left = []
+    for index, row in table.rows():
+        if stop_event.is_set():
+            logging.info("Обработка остановлена пользователем")
+            update_status("Обработка остановлена пользователем")
+            return False
+        if is_blank(row["фио"]):
+            count_skip("фио", row["фио"])
+            continue
+        due_rules = [rule for rule in AWARD_RULES if is_award_due(rule, row)]
+        if not due_rules:
+            continue
+        driver = supervisor.checkpoint()
+        cleared = []
+        try:
+            for rule in due_rules:
+                if breaker.is_open(row["фио"]):
+                    logging.warning("Пропуск начисления %s пользователя %s: слишком много ошибок", rule["label"], row["фио"])
+                    run_metrics.skip()
+                    continue
+                if deadline is not None and action_costs.estimate(rule, row[rule["column"]]) > deadline - time.time():
+                    left.append(row["фио"])
+                    run_metrics.skip()
+                    continue
+                if award_with_breaker(supervisor, breaker, driver, row, index, rule, writeback):
+                    cleared.append((index, rule["column"]))
+                driver = supervisor.driver or supervisor.checkpoint()
+        finally:
+            # подтвержденные начисления очищаются и при ошибке посреди ученика, иначе следующий запуск начислит их повторно
+            if cleared:
+                writeback(cleared)
+    if left:
+        logging.warning("Не успели к сроку: %s начислений", len(left))
+        update_status(f"Не успели к сроку: {len(left)} начислений")
+        supervisor.profile.event("deadline", left=len(left))
+        breaker.unfinished_tasks += left
+    return True
+
+
+def start_in_background(supervisor: DriverSupervisor) -> threading.Thread:
+    """Запускает браузер и входит на сайт в отдельном потоке, пока основной поток читает лист.
+
+    Ошибка запуска не прерывает обработку: первый checkpoint() попробует войти еще раз.
+    """
+    prefix = getattr(status_context, "prefix", "")
+
+    def start() -> None:
+        status_context.prefix = prefix
+        try:
+            supervisor.start()
+        except Exception as e:
+            logging.error("Не удалось заранее запустить браузер: %s", e)
+            supervisor.quit()
+
+    thread = threading.Thread(target=start, name=f"{threading.current_thread().name}-login", daemon=True)
+    thread.start()
+    return thread
+
+
+def process_streamed(chunks: list, google_sheet: GoogleSheet, supervisor: DriverSupervisor, breaker: FailureBreaker, deadline: float | None = None) -> None:
+    """Обрабатывает большой лист по порциям, проверенным validate_stream, и очищает ячейки каждой порции точечно.
+
+    Порядок приоритетов при сроке deadline не применяется: начисления идут по
+    строкам, а не успевающие к сроку пропускаются.
+    """
+    for chunk in chunks:
+        supervisor.profile.sample("chunk", first_row=int(chunk.index[0]), rows=len(chunk))
+        if not process_rows(chunk, supervisor, breaker, lambda cells, chunk=chunk: google_sheet.clear_cells(chunk, cells), deadline):
+            return
+
+
+class TaskQueue:
+    """Общая очередь начислений в файле SQLite с арендой задач.
+
+    Задача - все отметки одного ученика. Рабочий берет задачу в аренду на
+    task_lease_seconds и продлевает аренду после каждого начисления; задачу с
+    истекшей арендой (машина выключилась, браузер завис) получает другой рабочий.
+    После task_max_attempts аренд задача считается неудачной.
+
+    Перед начислением столбец отмечается в задаче начатым, после - его результат
+    записывается в задачу. Следующий владелец задачи записанные столбцы не повторяет.
+
+    Аренда держится на блокировках SQLite, а по SMB и NFS они ненадежны, поэтому
+    файл очереди должен лежать на локальном диске. Машины в сети работают с
+    очередью через координатор (TaskQueueHandler и RemoteTaskQueue).
+    """
+
+    STARTED = "started"
+
+    def __init__(self, path: str) -> None:
+        if is_network_path(path):
+            raise ValueError(f"очередь {path} в сетевой папке: блокировки SQLite по сети ненадежны, укажите файл на локальном диске и запустите координатор (--coordinator)")
+        self.path = path
+        with self.transaction() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "id INTEGER PRIMARY KEY, run TEXT NOT NULL, login TEXT NOT NULL, payload TEXT NOT NULL, "
+                "state TEXT NOT NULL DEFAULT 'pending', worker TEXT, lease_until REAL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, results TEXT, written INTEGER NOT NULL DEFAULT 0)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (login, state, lease_until)")
+
+    @contextmanager
+    def transaction(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            yield db
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    def publish(self, login: str, payloads: list) -> str:
+        """Публикует задачи одного запуска и возвращает идентификатор запуска."""
+        run = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        with self.transaction() as db:
+            db.executemany(
+                "INSERT INTO tasks (run, login, payload) VALUES (?, ?, ?)",
+                [(run, login, json.dumps(payload, ensure_ascii=False)) for payload in payloads],
+            )
+        return run
+
+    def lease(self, worker: str, login: str, lease_seconds: float, max_attempts: int, run: str | None = None) -> dict | None:
+        """Берет в аренду свободную задачу учетной записи login или возвращает None; results - столбцы, записанные прежними владельцами."""
+        now = time.time()
+        with self.transaction() as db:
+            db.execute(
+                "UPDATE tasks SET state = 'failed' WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, max_attempts),
+            )
+            query = "SELECT id, run, payload, results FROM tasks WHERE login = ? AND (state = 'pending' OR (state = 'leased' AND lease_until < ?))"
+            params: list = [login, now]
+            if run is not None:
+                query += " AND run = ?"
+                params.append(run)
+            found = db.execute(query + " ORDER BY id LIMIT 1", params).fetchone()
+            if found is None:
+                return None
+            db.execute(
+                "UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                (worker, now + lease_seconds, found[0]),
+            )
+        return {"id": found[0], "run": found[1], **json.loads(found[2]), "results": json.loads(found[3] or "{}")}
+
+    def claim(self, task_id: int, worker: str, column: str, lease_seconds: float) -> bool:
+        """Отмечает столбец начатым и продлевает аренду; False, если аренда потеряна или столбец уже записан."""
+        with self.transaction() as db:
+            found = db.execute("SELECT results FROM tasks WHERE id = ? AND worker = ? AND state = 'leased'", (task_id, worker)).fetchone()
+            if found is None:
+                return False
+            results = json.loads(found[0] or "{}")
+            if column in results:
+                return False
+            results[column] = self.STARTED
+            db.execute(
+                "UPDATE tasks SET results = ?, lease_until = ? WHERE id = ?",
+                (json.dumps(results), time.time() + lease_seconds, task_id),
+            )
+        return True
+
+    def record(self, task_id: int, worker: str, column: str, result: str, lease_seconds: float) -> None:
+        """Записывает результат столбца (StepResult.value) и продлевает аренду, если она еще у worker.
+
+        Результат записывается и после потери аренды: новый владелец этот столбец
+        уже не начнет, а в лист попадет то, что на самом деле произошло на сайте.
+        """
+        with self.transaction() as db:
+            found = db.execute("SELECT results FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if found is None:
+                return
+            results = json.loads(found[0] or "{}")
+            results[column] = result
+            db.execute("UPDATE tasks SET results = ? WHERE id = ?", (json.dumps(results), task_id))
+            db.execute(
+                "UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                (time.time() + lease_seconds, task_id, worker),
+            )
+
+    def ack(self, task_id: int, worker: str) -> None:
+        """Отмечает задачу выполненной, если аренда еще у worker."""
+        with self.transaction() as db:
+            db.execute("UPDATE tasks SET state = 'done' WHERE id = ? AND worker = ? AND state = 'leased'", (task_id, worker))
+
+    def collect(self, run: str) -> list:
+        """Забирает завершенные задачи запуска, еще не записанные в лист, и помечает их записанными."""
+        with self.transaction() as db:
+            found = db.execute(
+                "SELECT id, payload, results FROM tasks WHERE run = ? AND state IN ('done', 'failed') AND written = 0",
+                (run,),
+            ).fetchall()
+            db.executemany("UPDATE tasks SET written = 1 WHERE id = ?", [(task_id,) for task_id, _, _ in found])
+        return [{"id": task_id, **json.loads(payload), "results": json.loads(results or "{}")} for task_id, payload, results in found]
+
+    def remaining(self, run: str, expired: bool = True) -> int:
+        """Число невыполненных задач запуска; expired=False не считает задачи с истекшей арендой."""
+        query = "SELECT COUNT(*) FROM tasks WHERE run = ? AND (state = 'pending' OR (state = 'leased' AND lease_until >= ?))"
+        with self.transaction() as db:
+            return db.execute(query, (run, 0 if expired else time.time())).fetchone()[0]
+
+    def cancel(self, run: str) -> None:
+        """Снимает с очереди еще не взятые задачи запуска."""
+        with self.transaction() as db:
+            db.execute("UPDATE tasks SET state = 'cancelled' WHERE run = ? AND state = 'pending'", (run,))
+
+
+# методы TaskQueue, которые координатор выполняет по запросам рабочих
+TASK_QUEUE_METHODS = ("publish", "lease", "claim", "record", "ack", "collect", "remaining", "cancel")
+
+
+class RemoteTaskQueue:
+    """Общая очередь на координаторе (python bot.py --coordinator) с теми же методами, что у TaskQueue."""
+
+    def __init__(self, url: str, token: str = "") -> None:
+        self.url = url.rstrip("/")
+        self.token = token
+
+    def call(self, method: str, **params):
+        request = urllib.request.Request(
+            f"{self.url}/{method}",
+            data=json.dumps(params, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json", "X-Queue-Token": self.token},
+        )
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read())["result"]
+
+    def publish(self, login: str, payloads: list) -> str:
+        return self.call("publish", login=login, payloads=payloads)
+
+    def lease(self, worker: str, login: str, lease_seconds: float, max_attempts: int, run: str | None = None) -> dict | None:
+        return self.call("lease", worker=worker, login=login, lease_seconds=lease_seconds, max_attempts=max_attempts, run=run)
+
+    def claim(self, task_id: int, worker: str, column: str, lease_seconds: float) -> bool:
+        return self.call("claim", task_id=task_id, worker=worker, column=column, lease_seconds=lease_seconds)
+
+    def record(self, task_id: int, worker: str, column: str, result: str, lease_seconds: float) -> None:
+        self.call("record", task_id=task_id, worker=worker, column=column, result=result, lease_seconds=lease_seconds)
+
+    def ack(self, task_id: int, worker: str) -> None:
+        self.call("ack", task_id=task_id, worker=worker)
+
+    def collect(self, run: str) -> list:
+        return self.call("collect", run=run)
+
+    def remaining(self, run: str, expired: bool = True) -> int:
+        return self.call("remaining", run=run, expired=expired)
+
+    def cancel(self, run: str) -> None:
+        self.call("cancel", run=run)
+
+
+class TaskQueueHandler(BaseHTTPRequestHandler):
+    """Выполняет методы очереди координатора: POST /метод с именованными параметрами в JSON."""
+
+    def do_POST(self) -> None:
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if server.token and not hmac.compare_digest(self.headers.get("X-Queue-Token", ""), server.token):
+            self.send_error(403, "Bad token")
+            return
+        method = self.path.strip("/")
+        if method not in TASK_QUEUE_METHODS:
+            self.send_error(404, "Unknown method")
+            return
+        try:
+            result = getattr(server.task_queue, method)(**json.loads(body or b"{}"))
+        except Exception as e:
+            logging.error("Ошибка метода очереди %s: %s", method, e)
+            self.send_error(500, type(e).__name__)
+            return
+        data = json.dumps({"result": result}, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug(format, *args)
+
+
+def make_coordinator(queue_path: str, port: int = 0, token: str = "") -> ThreadingHTTPServer:
+    """Создает координатор общей очереди: файл queue_path на локальном диске, доступ по HTTP со всех адресов."""
+    server = ThreadingHTTPServer(("0.0.0.0", port), TaskQueueHandler)
+    server.task_queue = TaskQueue(queue_path)
+    server.token = token
+    return server
+
+
+def serve_coordinator(queue_path: str, port: int, token: str) -> None:
+    """Запускает координатор общей очереди до Ctrl+C."""
+    server = make_coordinator(queue_path, port, token)
+    if not token:
+        logging.warning("task_queue_token не задан: очередь доступна любому компьютеру в сети")
+    print(f"Очередь {queue_path} доступна по адресу http://{socket.gethostname()}:{server.server_port}/ - укажите его в task_queue в settings.json")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def open_task_queue(location: str, token: str = ""):
+    """Очередь на координаторе по адресу http://... или в локальном файле."""
+    if location.startswith(("http://", "https://")):
+        return RemoteTaskQueue(location, token)
+    return TaskQueue(location)
+
+
+# файловые системы, на которых блокировки SQLite ненадежны
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "sshfs", "9p", "afs", "ceph", "glusterfs"}
+
+
+def is_network_path(path: str) -> bool:
+    """Лежит ли файл в сетевой папке: UNC-путь, сетевой диск Windows или NFS/SMB в Linux."""
+    full = os.path.realpath(path)
+    if path.startswith(("\\\\", "//")) or full.startswith(("\\\\", "//")):
+        return True
+    if sys.platform == "win32":
+        import ctypes
+
+        drive = os.path.splitdrive(full)[0]
+        # 4 - DRIVE_REMOTE, подключенный сетевой диск
+        return bool(drive) and ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == 4
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as file:
+            mounts = [line.split()[1:3] for line in file]
+    except OSError:
+        return False
+    mounted = [(point, kind) for point, kind in mounts if full == point or full.startswith(point.rstrip("/") + "/")]
+    if not mounted:
+        return False
+    kind = max(mounted, key=lambda mount: len(mount[0]))[1]
+    return kind.split(".")[-1] in NETWORK_FILESYSTEMS
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def execute_task(supervisor: DriverSupervisor, breaker: FailureBreaker, task_queue, task: dict, worker: str, lease_seconds: float) -> None:
+    """Выполняет отметки задачи обычным путем начисления, записывая результат каждого столбца в очередь.
+
+    Столбцы, записанные прежним владельцем задачи, не повторяются. Начатое им, но не
+    записанное или неподтвержденное начисление сайт мог принять, поэтому такие
+    столбцы остаются в таблице для ручной проверки.
+    """
+    supervisor.club = task.get("club", supervisor.login)
+    supervisor.worksheet = task.get("worksheet", "")
+    columns = list(task["marks"])
+    recorded = task.get("results") or {}
+    suspect = [column for column, result in recorded.items() if result in (TaskQueue.STARTED, StepResult.UNCONFIRMED.value)]
+    if suspect:
+        logging.warning("Задача ученика %s взята повторно: начисления %s могли пройти, проверьте их вручную", task["student"], ", ".join(suspect))
+        breaker.unconfirmed.append(task["student"])
+    table = SheetTable(["фио"] + columns, [[task["student"]] + [task["marks"][column] for column in columns]])
+    report_name_problems(supervisor.resolve_names(table))
+    row = table.row(0)
+    driver = supervisor.checkpoint()
+    for column in columns:
+        if column in recorded:
+            continue
+        if stop_event.is_set() or breaker.is_open(task["student"]):
+            break
+        if not task_queue.claim(task["id"], worker, column, lease_seconds):
+            logging.warning("Аренда задачи ученика %s истекла, задачу выполняет другой рабочий", task["student"])
+            return
+        result = apply_rule(supervisor, driver, row, RULES_BY_COLUMN[column])
+        breaker.record(task["student"], result)
+        task_queue.record(task["id"], worker, column, result.value, lease_seconds)
+        breaker.pause_if_site_down(supervisor)
+        driver = supervisor.driver or supervisor.checkpoint()
+    task_queue.ack(task["id"], worker)
+
+
+def process_distributed(table: SheetTable, supervisor: DriverSupervisor, breaker: FailureBreaker, task_queue, settings: dict, writeback) -> None:
+    """Публикует отметки листа в общую очередь и обрабатывает ее вместе с рабочими на других машинах.
+
+    Координатор тоже берет задачи, но записывает результаты в лист только он.
+    """
+    payloads = []
+    for index, row in table.rows():
+        if is_blank(row["фио"]):
+            continue
+        marks = {rule["column"]: row[rule["column"]] for rule in AWARD_RULES if is_award_due(rule, row)}
+        if marks:
+            payloads.append({"index": index, "student": row["фио"], "marks": marks, "club": supervisor.club, "worksheet": supervisor.worksheet})
+    run = task_queue.publish(supervisor.login, payloads)
+    run_metrics.plan(sum(len(payload["marks"]) for payload in payloads))
+    logging.info("Опубликовано задач в очереди: %s (запуск %s)", len(payloads), run)
+    update_status(f"Опубликовано задач в очереди: {len(payloads)}")
+    worker = worker_name()
+    lease_seconds = settings["task_lease_seconds"]
+    # задачи, выполненные этим процессом: их начисления уже учтены в run_metrics
+    local: set = set()
+
+    def write_collected() -> None:
+        for done in task_queue.collect(run):
+            cleared = [(done["index"], column) for column, result in done["results"].items() if result == StepResult.OK.value]
+            if done["id"] not in local:
+                run_metrics.finish(True, len(cleared))
+                run_metrics.finish(False, len(done["results"]) - len(cleared))
+            run_metrics.skip(len(done["marks"]) - len(done["results"]))
+            if cleared:
+                writeback(cleared)
+            suspect = [column for column, result in done["results"].items() if result == TaskQueue.STARTED]
+            if suspect:
+                logging.warning("Начисления %s ученику %s начаты, но результат не записан: проверьте их вручную", ", ".join(suspect), done["student"])
+            if len(cleared) < len(done["marks"]):
+                breaker.unfinished_tasks.append(done["student"])
+
+    while True:
+        stopped = stop_event.is_set()
+        if stopped:
+            task_queue.cancel(run)
+        task = None if stopped else task_queue.lease(worker, supervisor.login, lease_seconds, settings["task_max_attempts"], run)
+        if task is not None:
+            local.add(task["id"])
+            execute_task(supervisor, breaker, task_queue, task, worker, lease_seconds)
+        write_collected()
+        # после остановки ждем только задачи, которые другие машины выполняют прямо сейчас
+        if task_queue.remaining(run, expired=not stopped) == 0:
+            write_collected()
+            return
+        if task is None:
+            update_status(f"Ожидание задач у других машин: {task_queue.remaining(run)}")
+            stop_event.wait(settings["task_poll_seconds"])
+
+
+def run_worker(queue_path: str) -> None:
+    """Рабочий процесс без окна: берет задачи из общей очереди и начисляет под учетной записью из credentials.json."""
+    settings = load_settings()
+    warn_without_psutil(settings)
+    site_limiter.configure(settings)
+    award_history.configure(settings)
+    action_costs.load()
+    with open(CREDENTIALS_FILE, "r") as file:
+        credentials: dict = json.load(file)
+    task_queue = open_task_queue(queue_path, settings["task_queue_token"])
+    worker = worker_name()
+    lease_seconds = settings["task_lease_seconds"]
+    profile = RunProfile("worker")
+    supervisor = DriverSupervisor(credentials["login"], credentials["password"], settings, profile)
+    breakers: dict = {}
+    logging.info("Рабочий %s ждет задачи из %s", worker, queue_path)
+    try:
+        while not stop_event.is_set():
+            try:
+                task = task_queue.lease(worker, supervisor.login, lease_seconds, settings["task_max_attempts"])
+                if task is None:
+                    stop_event.wait(settings["task_poll_seconds"])
+                    continue
+                breaker = breakers.setdefault(task["run"], FailureBreaker(settings))
+                execute_task(supervisor, breaker, task_queue, task, worker, lease_seconds)
+            except OSError as e:
+                # координатор недоступен: незаписанный столбец после истечения аренды уйдет на ручную проверку
+                logging.error("Очередь недоступна: %s", e)
+                stop_event.wait(settings["task_poll_seconds"])
+    except KeyboardInterrupt:
+        logging.info("Рабочий остановлен")
+    finally:
+        supervisor.quit()
+        supervisor.report_run()
+        award_history.flush()
+        report_skips(profile)
+        profile.save()
+
+
+def run_sheet(target: dict, worksheet: str, settings: dict, slots: threading.Semaphore | None = None, watch: bool = False) -> dict:
+    """Обрабатывает один лист одного клуба.
+
+    Returns:
+        dict: status (empty, done или watch), unfinished - ученики с необработанными
+        отметками, name_problems - ФИО, не сопоставленные с сайтом.
+    """
+    profile = RunProfile(target.get("name", ""))
+    supervisor: DriverSupervisor | None = None
+    try:
+        quota = sheets_quota(target["google_credentials_file"], settings["sheets_requests_per_minute"])
+        google_sheet = GoogleSheet(target["google_credentials_file"], target["spreadsheet_url"], worksheet, quota, client=target.get("client"))
+        supervisor = DriverSupervisor(target["login"], target["password"], settings, profile, slots)
+        supervisor.club = target.get("name") or target["login"]
+        supervisor.worksheet = worksheet
+        breaker = FailureBreaker(settings)
+
+        if watch:
+            if supervisor.start():
+                watch_sheet(google_sheet, supervisor, settings["watch_interval"])
+            return {"status": "watch", "unfinished": [], "name_problems": supervisor.name_problems}
+
+        deadline = run_deadline(settings)
+        if deadline is not None and settings["task_queue"]:
+            raise ValueError("срок окончания (deadline, time_budget_minutes) не поддерживается с общей очередью task_queue")
+        if google_sheet.answers.row_count > settings["stream_min_rows"]:
+            # браузер запускается и входит на сайт, пока лист скачивается для проверки
+            login = start_in_background(supervisor)
+            try:
+                chunks = validate_stream(google_sheet, settings["stream_chunk_rows"])
+            finally:
+                login.join()
+            process_streamed(chunks, google_sheet, supervisor, breaker, deadline)
+            retry_deferred(supervisor, breaker, settings, deadline)
+        else:
+            table = google_sheet.load_data_from_google_sheet()
+
+            if table is None:
+                raise ValueError("No data loaded from Google Sheet")
+
+            validate_sheet(SheetValidator(), table)
+
+            if not has_pending_awards(table):
+                logging.info("В таблице нет отметок для начисления")
+                update_status("В таблице нет отметок для начисления")
+                return {"status": "empty", "unfinished": [], "name_problems": []}
+
+            def writeback(cells: list) -> None:
+                google_sheet.write_cleared(table, cells)
+
+            if settings["task_queue"]:
+                process_distributed(table, supervisor, breaker, open_task_queue(settings["task_queue"], settings["task_queue_token"]), settings, writeback)
+            elif deadline is not None:
+                process_scheduled(table, supervisor, breaker, writeback, settings, deadline)
             else:
-                logging.info(f"Пропущена строка: ФИО отсутствует (ФИО: {row.get('фио', 'пусто')})")
-                update_status(f"Пропущена строка: ФИО отсутствует (ФИО: {row.get('фио', 'пусто')})")
-
-        if df is not None:
-            google_sheet.save_data_to_google_sheet(df)
-            logging.info("Обработка завершена успешно")
-            update_status("Обработка завершена успешно")
-            messagebox.showinfo("Завершено", "Обработка завершена успешно.")
+                process_rows(table, supervisor, breaker, writeback)
+            retry_deferred(supervisor, breaker, settings, deadline)
+
+        if not settings["task_queue"]:
+            reconcile_balances(supervisor)
+        return {"status": "done", "unfinished": breaker.unfinished(), "name_problems": supervisor.name_problems}
+    finally:
+        if supervisor is not None:
+            supervisor.quit()
+            supervisor.save_recording()
+            supervisor.report_run()
+        award_history.flush()
+        action_costs.save()
+        report_skips(profile)
+        profile.save()
+
+
+def start_processing() -> None:
+    """Основная логика обработки данных."""
+    save_credentials()
+    stop_event.clear()
+    settings = load_settings()
+    warn_without_psutil(settings)
+    site_limiter.configure(settings)
+    award_history.configure(settings)
+    action_costs.load()
+    run_metrics.reset()
+    target = {
+        "login": login_entry.get(),
+        "password": password_entry.get(),
+        "google_credentials_file": google_credentials_file_entry.get(),
+        "spreadsheet_url": spreadsheet_url_entry.get(),
+    }
+    try:
+        update_status("Начинается обработка данных...")
+        result = run_sheet(target, worksheet_name_entry.get(), settings, watch=watch_var.get() == 1)
+        if result["status"] == "watch":
+            return
+        if result["status"] == "empty":
+            messagebox.showinfo("Завершено", "В таблице нет отметок для начисления.")
+            return
+
+        unfinished = result["unfinished"]
+        if unfinished:
+            names = ", ".join(str(name) for name in unfinished)
+            logging.warning("Не удалось обработать пользователей: %s", names)
+            update_status(f"Не удалось обработать пользователей: {names}")
+            details = f"Не удалось обработать пользователей: {names}"
+            if result["name_problems"]:
+                details += "\n\nПроверьте ФИО в таблице:\n" + "\n".join(result["name_problems"])
+            messagebox.showwarning("Завершено с ошибками", details)
+            return
+
+        logging.info("Обработка завершена успешно")
+        update_status("Обработка завершена успешно")
+        messagebox.showinfo("Завершено", "Обработка завершена успешно.")
     except Exception as e:
-        logging.error(f"Ошибка во время обработки: {e}")
+        logging.error("Ошибка во время обработки: %s", e)
         update_status(f"Ошибка во время обработки: {e}")
         messagebox.showerror("Ошибка", f"Произошла ошибка во время обработки: {e}")
-    finally:
-        if driver is not None:
-            driver.quit()
+
+
+def load_targets(path: str) -> list:
+    """Читает файл клубов: список {name, login, password, google_credentials_file, spreadsheet_url, worksheets}."""
+    with open(path, "r", encoding="utf-8") as file:
+        targets = json.load(file)
+    if not isinstance(targets, list):
+        raise ValueError("ожидается список клубов")
+    required = ("login", "password", "google_credentials_file", "spreadsheet_url", "worksheets")
+    for position, target in enumerate(targets, start=1):
+        missing = [key for key in required if not target.get(key)]
+        if missing:
+            raise ValueError(f"клуб {target.get('name', position)}: не заполнено {', '.join(missing)}")
+        target.setdefault("name", target["login"])
+    return targets
+
+
+def run_target(target: dict, settings: dict, slots: threading.Semaphore, results: dict) -> None:
+    """Обрабатывает листы одного клуба по очереди; выполняется в отдельном потоке."""
+    status_context.prefix = f"[{target['name']}] "
+    for worksheet in target["worksheets"]:
+        if stop_event.is_set():
+            break
+        key = f"{target['name']} / {worksheet}"
+        try:
+            results[key] = run_sheet(target, worksheet, settings, slots)
+        except Exception as e:
+            logging.error("Ошибка обработки %s: %s", key, e)
+            update_status(f"Ошибка обработки листа {worksheet}: {e}")
+            results[key] = {"status": "error", "error": str(e), "unfinished": [], "name_problems": []}
+
+
+def process_targets(path: str) -> None:
+    """Обрабатывает все клубы из файла одновременно, открывая не больше max_browsers браузеров."""
+    stop_event.clear()
+    settings = load_settings()
+    warn_without_psutil(settings)
+    site_limiter.configure(settings)
+    award_history.configure(settings)
+    action_costs.load()
+    run_metrics.reset()
+    try:
+        targets = load_targets(path)
+    except Exception as e:
+        logging.error("Ошибка чтения файла клубов: %s", e)
+        update_status(f"Ошибка чтения файла клубов: {e}")
+        messagebox.showerror("Ошибка", f"Не удалось прочитать файл клубов: {e}")
+        return
+    slots = threading.BoundedSemaphore(settings["max_browsers"])
+    results: dict = {}
+    threads = [
+        threading.Thread(target=run_target, args=(target, settings, slots, results), name=target["name"])
+        for target in targets
+    ]
+    logging.info("Одновременная обработка клубов: %s", len(targets))
+    update_status(f"Одновременная обработка клубов: {len(targets)}")
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    lines = []
+    for key, result in sorted(results.items()):
+        if result["status"] == "error":
+            lines.append(f"{key}: ошибка - {result['error']}")
+        elif result["unfinished"]:
+            lines.append(f"{key}: не обработаны {', '.join(str(name) for name in result['unfinished'])}")
+        elif result["status"] == "empty":
+            lines.append(f"{key}: нет отметок")
+        else:
+            lines.append(f"{key}: готово")
+    summary = "\n".join(lines)
+    logging.info("Итоги по клубам:\n%s", summary)
+    update_status("Обработка клубов завершена")
+    if any(result["status"] == "error" or result["unfinished"] for result in results.values()):
+        messagebox.showwarning("Завершено с ошибками", summary)
+    else:
+        messagebox.showinfo("Завершено", summary)
+
+
+def start_targets_thread() -> None:
+    """Спрашивает файл клубов и запускает их обработку в отдельном потоке."""
+    path = filedialog.askopenfilename(title="Выберите файл клубов", initialfile=TARGETS_FILE, filetypes=[("JSON files", "*.json")])
+    if path:
+        threading.Thread(target=process_targets, args=(path,)).start()
 
 
 def start_processing_thread() -> None:
@@ -636,16 +3647,48 @@ def start_processing_thread() -> None:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KIBER Club - Бот для начисления Киберонов")
+    parser.add_argument("--coordinator", metavar="QUEUE", help="координатор общей очереди для рабочих на нескольких машинах: файл очереди на локальном диске")
+    parser.add_argument("--worker", nargs="?", const="", metavar="QUEUE", help="рабочий процесс без окна: брать задачи из общей очереди (по умолчанию task_queue из settings.json)")
+    parser.add_argument("--history", action="store_true", help="вывести итоги истории начислений по клубам, месяцам и столбцам")
+    parser.add_argument("--since", metavar="ГГГГ-ММ-ДД", help="начало периода для --history")
+    parser.add_argument("--until", metavar="ГГГГ-ММ-ДД", help="конец периода для --history")
+    parser.add_argument("--club", help="только этот клуб для --history")
+    parser.add_argument("--replay", metavar="BUNDLE", help="воспроизводить записанный сайт из набора на локальном сервере")
+    parser.add_argument("--port", type=int, default=8765, help="порт сервера воспроизведения или координатора очереди")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="множитель записанных задержек: 0 - без задержек, 2 - вдвое медленнее")
+    args = parser.parse_args()
+    setup_logging()
+    if args.replay:
+        serve_replay(args.replay, args.port, args.time_scale)
+        sys.exit()
+    if args.coordinator:
+        serve_coordinator(args.coordinator, args.port, load_settings()["task_queue_token"])
+        sys.exit()
+    if args.history:
+        print_history_report(load_settings()["history_dir"], args.since, args.until, args.club)
+        sys.exit()
+    stop_event = threading.Event()
+    # окно создается ниже; у рабочего процесса его нет, и состояние пишется только в журнал
+    status_message = None
+
+    def update_status(message: str) -> None:
+        if status_message is not None:
+            status_message.set(getattr(status_context, "prefix", "") + message)
+
+    if args.worker is not None:
+        queue_path = args.worker or load_settings()["task_queue"]
+        if not queue_path:
+            parser.error("не задана очередь: укажите файл или адрес координатора после --worker или в task_queue в settings.json")
+        run_worker(queue_path)
+        sys.exit()
+
     root = Tk()
     root.title("KIBER Club - Бот для начисления Киберонов")
 
     status_message = StringVar()
 
 
-    def update_status(message: str) -> None:
-        status_message.set(message)
-
-
     def center_window(window: Tk) -> None:
         """
         Центрирует окно на экране.
@@ -706,18 +3749,44 @@ if __name__ == "__main__":
     remember_checkbutton = Checkbutton(root, text="Запомнить", variable=remember_var)
     remember_checkbutton.grid(row=6, column=0, columnspan=2, pady=10)
 
+    watch_var = IntVar()
+    watch_checkbutton = Checkbutton(root, text="Режим наблюдения", variable=watch_var)
+    watch_checkbutton.grid(row=7, column=0, columnspan=2)
+
+    targets_button = Button(root, text="Клубы из файла...", command=start_targets_thread)
+    targets_button.grid(row=7, column=2, padx=10)
+
     start_button = Button(root, text="Начать", command=start_processing_thread)
-    start_button.grid(row=7, column=0, columnspan=2, pady=20)
+    start_button.grid(row=8, column=0, columnspan=2, pady=20)
+
+    stop_button = Button(root, text="Остановить", command=stop_event.set)
+    stop_button.grid(row=8, column=2, padx=10)
 
     status_label = Label(root, textvariable=status_message, relief="sunken", anchor="w")
-    status_label.grid(row=8, column=0, columnspan=3, sticky="ew")
+    status_label.grid(row=9, column=0, columnspan=3, sticky="ew")
 
-    load_credentials()
+    dashboard_message = StringVar()
+    dashboard_label = Label(root, textvariable=dashboard_message, font="TkFixedFont", justify="left", anchor="w")
+    dashboard_label.grid(row=10, column=0, columnspan=3, sticky="ew", padx=10, pady=5)
 
-    google_credentials_file = google_credentials_file_entry.get()
-    spreadsheet_url = spreadsheet_url_entry.get()
-    worksheet_name = worksheet_name_entry.get()
+    def refresh_dashboard() -> None:
+        """Перерисовывает панель запуска и планирует следующее обновление."""
+        dashboard_message.set(format_dashboard(run_metrics.snapshot(), sheets_quota_usage()))
+        root.after(DASHBOARD_REFRESH_MS, refresh_dashboard)
+
+    refresh_dashboard()
+
+    load_credentials()
 
     center_window(root)
 
+    warm_up_thread = threading.Thread(target=warm_up, args=(google_credentials_file_entry.get(), load_settings()), name="warm-up", daemon=True)
+
+    def window_ready() -> None:
+        """Окно показано: запоминает время и начинает фоновую загрузку зависимостей."""
+        mark_window_ready()
+        warm_up_thread.start()
+
+    root.after_idle(window_ready)
+
     root.mainloop()
@@ -0,0 +1,18 @@
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import bot  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def headless_bot():
+    """Без окна: состояние не показывается, остановка не запрашивается."""
+    bot.update_status = lambda message: None
+    bot.stop_event = threading.Event()
+    yield bot
@@ -0,0 +1,347 @@
+"""Двойники Google Sheets и сайта для проверок бота без Google и без настоящего сайта.
+
+Все проверки идут через код bot.py: GoogleSheet, run_sheet и сервер
+воспроизведения записи из make_replay_server.
+"""
+
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+
+import gspread
+from requests import Response
+
+import bot
+
+# Проверка масштабирования: допустимая степень роста метрик от числа учеников (1 - линейный рост)
+SCALE_LIMITS = {"requests": 1.15, "cells_read": 1.15, "cells_written": 1.15, "bytes": 1.15, "seconds": 1.3}
+
+
+class FaultInjector:
+    """Неполадки сервера воспроизведения по правилам сценария.
+
+    Правило применяется к запросам, путь которых содержит match (и с методом
+    method, если он указан): задержка latency, обрыв без ответа drop_rate,
+    предыдущий записанный ответ вместо следующего stale_rate, ошибка status
+    (по умолчанию 503) error_rate. Оборванный запрос начисления сайт успел
+    выполнить, ответ с ошибкой - нет.
+    """
+
+    def __init__(self, scenario: dict) -> None:
+        self.rules: list = scenario.get("rules", [])
+        self.award_path: str = scenario.get("award_path", "sendsave")
+        self.random = random.Random(scenario.get("seed", 0))
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "delayed": 0, "delay_seconds": 0.0, "dropped": 0, "stale": 0, "errors": 0, "awards_accepted": 0, "awards_dropped": 0, "awards_failed": 0}
+
+    def sample_delay(self, latency: dict | None) -> float:
+        """Задержка в секундах по распределению правила: fixed (ms), uniform (min_ms, max_ms) или lognormal (median_ms, sigma)."""
+        if not latency:
+            return 0.0
+        kind = latency.get("distribution", "fixed")
+        if kind == "uniform":
+            milliseconds = self.random.uniform(latency["min_ms"], latency["max_ms"])
+        elif kind == "lognormal":
+            milliseconds = self.random.lognormvariate(math.log(latency["median_ms"]), latency.get("sigma", 0.5))
+        else:
+            milliseconds = latency["ms"]
+        return milliseconds / 1000
+
+    def plan(self, method: str, path: str) -> dict:
+        """Решает, что сделать с запросом: {delay: секунды, drop, stale, status: код ошибки или None}."""
+        plan = {"delay": 0.0, "drop": False, "stale": False, "status": None}
+        with self.lock:
+            self.stats["requests"] += 1
+            for rule in self.rules:
+                if rule.get("method", method) != method or rule.get("match", "") not in path:
+                    continue
+                plan["delay"] += self.sample_delay(rule.get("latency"))
+                plan["drop"] = plan["drop"] or self.random.random() < rule.get("drop_rate", 0)
+                plan["stale"] = plan["stale"] or self.random.random() < rule.get("stale_rate", 0)
+                if self.random.random() < rule.get("error_rate", 0):
+                    plan["status"] = rule.get("status", 503)
+            if plan["drop"]:
+                plan["status"] = None
+            if plan["delay"]:
+                self.stats["delayed"] += 1
+                self.stats["delay_seconds"] += plan["delay"]
+            self.stats["dropped"] += plan["drop"]
+            self.stats["stale"] += plan["stale"]
+            self.stats["errors"] += plan["status"] is not None
+            if method == "POST" and self.award_path in path:
+                self.stats["awards_failed" if plan["status"] is not None else "awards_accepted"] += 1
+                self.stats["awards_dropped"] += plan["drop"]
+        return plan
+
+
+class MemoryWorksheet:
+    """Лист в памяти с теми методами gspread.Worksheet, которые использует GoogleSheet."""
+
+    def __init__(self, client: "MemorySheetsClient", title: str, header: list, rows: list) -> None:
+        self.client = client
+        self.title = title
+        self.id = 0
+        self.header = list(header)
+        self.rows = [list(row) for row in rows]
+
+    @property
+    def row_count(self) -> int:
+        return len(self.rows) + 1
+
+    def get_all_records(self) -> list:
+        self.client.request("read", (len(self.rows) + 1) * len(self.header), [self.header] + self.rows)
+        return [dict(zip(self.header, gspread.utils.numericise_all(row))) for row in self.rows]
+
+    def row_values(self, row: int) -> list:
+        values = self.header if row == 1 else self.rows[row - 2]
+        self.client.request("read", len(values), values)
+        return list(values)
+
+    def get(self, range_name: str) -> list:
+        first, last = range_name.split(":")
+        values = self.rows[gspread.utils.a1_to_rowcol(first)[0] - 2 : gspread.utils.a1_to_rowcol(last)[0] - 1]
+        self.client.request("read", len(values) * len(self.header), values)
+        return [list(row) for row in values]
+
+    def batch_clear(self, ranges: list) -> None:
+        self.client.request("write", len(ranges), ranges)
+        for cell in ranges:
+            row, column = gspread.utils.a1_to_rowcol(cell)
+            self.rows[row - 2][column - 1] = ""
+
+
+class MemorySpreadsheet:
+    def __init__(self, client: "MemorySheetsClient", worksheet: MemoryWorksheet) -> None:
+        self.client = client
+        self.id = "memory"
+        self.worksheet = worksheet
+
+    def worksheets(self) -> list:
+        self.client.request("meta", 0, [])
+        return [self.worksheet]
+
+    def get_worksheet_by_id(self, sheet_id: int) -> MemoryWorksheet:
+        self.client.request("meta", 0, [])
+        return self.worksheet
+
+    def get_lastUpdateTime(self) -> None:
+        """Без ревизии: кэш листа на диске не читается и не пишется."""
+        self.client.request("meta", 0, [])
+        return None
+
+
+class MemorySheetsClient:
+    """Двойник клиента gspread: считает запросы, ячейки и байты и отвечает 429 сверх минутной квоты.
+
+    Время идет по своим часам now: проверка масштабирования переводит их на оценку
+    длительности начислений. Квота проверяется по этим часам; take() заменяет
+    SheetsQuota и переводит часы до освобождения места, поэтому 429 получает
+    только запрос к API, перед которым GoogleSheet не вызвал throttle().
+    """
+
+    def __init__(self, header: list, rows: list, per_minute: int) -> None:
+        self.per_minute = per_minute
+        self.now = 0.0
+        self.calls: deque = deque()
+        self.stats = {"requests": 0, "reads": 0, "writes": 0, "cells_read": 0, "cells_written": 0, "bytes": 0, "rejected": 0}
+        self.spreadsheet = MemorySpreadsheet(self, MemoryWorksheet(self, "Лист1", header, rows))
+
+    def open_by_url(self, url: str) -> MemorySpreadsheet:
+        self.request("meta", 0, [])
+        return self.spreadsheet
+
+    def expire(self) -> None:
+        while self.calls and self.now - self.calls[0] >= 60:
+            self.calls.popleft()
+
+    def take(self) -> None:
+        self.expire()
+        while len(self.calls) >= self.per_minute:
+            self.now = self.calls[0] + 60
+            self.expire()
+
+    def request(self, kind: str, cells: int, payload) -> None:
+        """Учитывает запрос к API; при исчерпанной квоте бросает APIError 429, как Google Sheets."""
+        self.expire()
+        if len(self.calls) >= self.per_minute:
+            self.stats["rejected"] += 1
+            response = Response()
+            response.status_code = 429
+            response._content = json.dumps({"error": {"code": 429, "message": "Quota exceeded", "status": "RESOURCE_EXHAUSTED"}}).encode()
+            raise gspread.exceptions.APIError(response)
+        self.calls.append(self.now)
+        self.stats["requests"] += 1
+        self.stats["bytes"] += len(json.dumps(payload, ensure_ascii=False).encode())
+        if kind == "read":
+            self.stats["reads"] += 1
+            self.stats["cells_read"] += cells
+        elif kind == "write":
+            self.stats["writes"] += 1
+            self.stats["cells_written"] += cells
+
+
+class StubSupervisor:
+    """Супервизор без браузера: имена не сверяются, драйвер не нужен."""
+
+    def __init__(self) -> None:
+        self.login = "login"
+        self.club = ""
+        self.worksheet = ""
+        self.driver = None
+        self.profile = bot.RunProfile()
+
+    def resolve_names(self, table) -> list:
+        return []
+
+    def checkpoint(self):
+        return None
+
+
+def synthetic_sheet(students: int, density: float, seed: int = 0, names: list | None = None) -> tuple:
+    """Лист по шаблону: students учеников (с ФИО из names, если они заданы), каждая ячейка отметки заполнена с вероятностью density."""
+    rng = random.Random(seed)
+    header = ["фио"] + [rule["column"] for rule in bot.AWARD_RULES]
+    rows = []
+    for number in range(1, students + 1):
+        row = [names[number - 1] if names else f"Ученик{number} Проверочный Тестович"]
+        for rule in bot.AWARD_RULES:
+            if rng.random() >= density:
+                row.append("")
+            elif rule["kind"] == "bonus":
+                row.append("да")
+            elif rule["kind"] == "activity":
+                row.append(str(rng.choice([5, 10, 15, 20])))
+            else:
+                row.append(str(rng.randint(1, 3)))
+        rows.append(row)
+    return header, rows
+
+
+def award_table_offline(client: MemorySheetsClient, table, writeback) -> int:
+    """Проходит лист как process_rows, но вместо браузера переводит часы двойника на оценку начисления."""
+    marks = 0
+    for index, row in table.rows():
+        if bot.is_blank(row["фио"]):
+            bot.count_skip("фио", row["фио"])
+            continue
+        due_rules = [rule for rule in bot.AWARD_RULES if bot.is_award_due(rule, row)]
+        for rule in due_rules:
+            client.now += bot.action_costs.estimate(rule, row[rule["column"]])
+        if due_rules:
+            marks += len(due_rules)
+            writeback([(index, rule["column"]) for rule in due_rules])
+    return marks
+
+
+def run_scale_case(students: int, density: float, settings: dict) -> dict:
+    """Один прогон листа synthetic_sheet через GoogleSheet и двойника клиента тем же путем, что run_sheet."""
+    header, rows = synthetic_sheet(students, density)
+    client = MemorySheetsClient(header, rows, settings["sheets_requests_per_minute"])
+    started = time.perf_counter()
+    google_sheet = bot.GoogleSheet("", "memory://scale-check", "Лист1", client, client=client)
+    marks = 0
+    if google_sheet.answers.row_count > settings["stream_min_rows"]:
+        for chunk in bot.validate_stream(google_sheet, settings["stream_chunk_rows"]):
+            marks += award_table_offline(client, chunk, lambda cells, chunk=chunk: google_sheet.clear_cells(chunk, cells))
+    else:
+        table = google_sheet.load_data_from_google_sheet()
+        bot.validate_sheet(bot.SheetValidator(), table)
+        marks = award_table_offline(client, table, lambda cells: google_sheet.write_cleared(table, cells))
+    seconds = time.perf_counter() - started
+    cleared = sum(1 for row in google_sheet.answers.rows for value in row[1:] if value == "")
+    expected = sum(1 for row in rows for value in row[1:] if value == "") + marks
+    if cleared != expected:
+        raise AssertionError(f"{students} учеников: очищено {cleared} ячеек, ожидалось {expected}")
+    return {"students": students, "marks": marks, "seconds": round(seconds, 3), "minutes": round(client.now / 60, 1), **client.stats}
+
+
+def growth_exponent(sizes: list, values: list) -> float | None:
+    """Показатель степени роста values от sizes по методу наименьших квадратов в логарифмах: 1 - линейный рост."""
+    points = [(math.log(size), math.log(value)) for size, value in zip(sizes, values) if size > 0 and value > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread if spread else None
+
+
+def bundle_student_names(bundle: dict) -> list:
+    """ФИО учеников в записи сайта: при сохранении они заменены на «Ученик N»."""
+    text = " ".join(entry["body"] for entry in bundle["entries"] if not entry["base64"])
+    return sorted(set(re.findall(r"Ученик \d+", text)), key=lambda name: int(name.split()[1]))
+
+
+def run_fault_scenario(bundle_path: str, scenario_path: str) -> dict:
+    """Полный запуск бота на записанном сайте с неполадками из сценария и листе в памяти.
+
+    Лист строится по ученикам из записи. В отчете: скорость, время, потерянное
+    на неудачных попытках и паузах, и сверка с сервером. Начисление, оборванное
+    без ответа, сайт выполнил, а бот оставляет его отметку в таблице и не
+    повторяет, поэтому принятых сайтом начислений должно быть столько, сколько
+    очищено отметок, плюс оборванные.
+    """
+    with open(scenario_path, "r", encoding="utf-8") as file:
+        scenario = json.load(file)
+    with open(bundle_path, "r", encoding="utf-8") as file:
+        names = bundle_student_names(json.load(file))
+    if not names:
+        raise ValueError("в записи нет учеников")
+    header, rows = synthetic_sheet(len(names), scenario.get("density", 0.3), scenario.get("seed", 0), names)
+    server = bot.make_replay_server(bundle_path, 0, scenario.get("time_scale", 1.0), FaultInjector(scenario))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    settings = {**bot.load_settings(), **scenario.get("settings", {}), "site_url": server.base_url, "record_dir": ""}
+    client = MemorySheetsClient(header, rows, settings["sheets_requests_per_minute"])
+    target = {"name": f"сценарий {scenario.get('name', os.path.basename(scenario_path))}", "login": "secret", "password": "secret", "google_credentials_file": "", "spreadsheet_url": "memory://fault-scenario", "client": client}
+    bot.site_limiter.configure(settings)
+    bot.action_costs.load()
+    saved_costs = dict(bot.action_costs.costs)
+    bot.run_metrics.reset()
+    started = time.perf_counter()
+    try:
+        # история и оценки длительности не должны запоминать прогон с неполадками
+        with tempfile.TemporaryDirectory() as history_dir:
+            bot.award_history.configure({**settings, "history_dir": history_dir})
+            result = bot.run_sheet(target, "Лист1", settings)
+            bot.award_history.flush()
+    finally:
+        server.shutdown()
+        server.server_close()
+        bot.action_costs.costs = saved_costs
+        bot.action_costs.save()
+        bot.award_history.configure(bot.load_settings())
+    seconds = time.perf_counter() - started
+    expected = 0
+    left = 0
+    for original, current in zip(rows, client.spreadsheet.worksheet.rows):
+        for position, rule in enumerate(bot.AWARD_RULES, start=1):
+            if bot.award_status(rule, gspread.utils.numericise(original[position])) != "due":
+                continue
+            if current[position] == "":
+                expected += bot.award_steps(rule, gspread.utils.numericise(original[position]))
+            else:
+                left += 1
+    metrics = bot.run_metrics.snapshot()
+    accepted = server.faults.stats["awards_accepted"]
+    dropped = server.faults.stats["awards_dropped"]
+    return {
+        "scenario": scenario.get("name", os.path.basename(scenario_path)),
+        "students": len(names),
+        "marks": metrics["planned"],
+        "done": metrics["done"],
+        "failed_attempts": metrics["failed"],
+        "left_in_sheet": left,
+        "seconds": round(seconds, 1),
+        "per_minute": round(metrics["done"] * 60 / seconds, 2) if seconds else 0.0,
+        "wasted_seconds": round(metrics["wasted"], 1),
+        "site": {key: round(value, 1) if isinstance(value, float) else value for key, value in server.faults.stats.items()},
+        "double_awards": max(accepted - dropped - expected, 0),
+        "lost_cells": max(expected - accepted, 0),
+        "unfinished": result["unfinished"],
+    }
@@ -0,0 +1,41 @@
+"""Сверка балансов: повторяются только неподтвержденные начисления, тезки не сверяются."""
+
+import bot
+
+
+class ListDriver:
+    """Драйвер, у которого список пользователей - заранее заданные строки [ссылка, ФИО, баланс]."""
+
+    def __init__(self, users: list) -> None:
+        self.users = users
+
+    def execute_script(self, script: str, *args) -> list:
+        return self.users
+
+
+BONUS = next(rule for rule in bot.AWARD_RULES if rule["column"] == "бонус пропуск")
+
+
+def started_reconciler(users: list) -> bot.BalanceReconciler:
+    balances = bot.BalanceReconciler("span.balance", {"бонус пропуск": 10})
+    balances.start(ListDriver(users))
+    return balances
+
+
+def test_confirmed_shortfall_is_not_retried():
+    balances = started_reconciler([["/users/1", "Иванов Иван", "100"], ["/users/2", "Петров Петр", "50"]])
+    balances.expect("Иванов Иван", {"фио": "Иванов Иван", "бонус пропуск": "да"}, BONUS, True)
+    balances.expect("Петров Петр", {"фио": "Петров Петр", "бонус пропуск": "да"}, BONUS, False)
+    # оба баланса не изменились: Иванов, например, потратил начисленное в магазине
+    after, _ = balances.read(ListDriver([["/users/1", "Иванов Иван", "100"], ["/users/2", "Петров Петр", "50"]]))
+    mismatches = balances.compare(after)
+    assert [key for key, _, _ in mismatches] == ["/users/1", "/users/2"]
+    assert balances.lost_award("/users/1", 10, 0) is None
+    assert balances.lost_award("/users/2", 10, 0)[1] is BONUS
+
+
+def test_namesakes_are_not_reconciled():
+    balances = started_reconciler([["/users/1", "Иванов Иван", "100"], ["/users/2", "Иванов  Иван", "50"]])
+    balances.expect("Иванов Иван", {"фио": "Иванов Иван", "бонус пропуск": "да"}, BONUS, False)
+    assert balances.compare({"/users/1": 100, "/users/2": 50}) == []
+    assert balances.unknown == {bot.normalize_name("Иванов Иван")}
@@ -0,0 +1,61 @@
+"""Подсчет команд WebDriver по начислениям и предупреждения о превышении command_budgets."""
+
+import pytest
+
+import bot
+
+
+class StubDriver:
+    """Драйвер без браузера: execute ничего не делает, как и у WebDriver, через него идут все команды."""
+
+    def execute(self, driver_command: str, params: dict | None = None) -> dict:
+        return {"value": None}
+
+
+def make_supervisor(budgets: dict) -> bot.DriverSupervisor:
+    return bot.DriverSupervisor("login", "password", {**bot.DEFAULT_SETTINGS, "command_budgets": budgets}, bot.RunProfile())
+
+
+def budget_events(supervisor: bot.DriverSupervisor) -> list:
+    return [event for event in supervisor.profile.events if event["kind"] == "command_budget"]
+
+
+def rule_of_kind(kind: str) -> dict:
+    return next(rule for rule in bot.AWARD_RULES if rule["kind"] == kind)
+
+
+def test_scope_counts_only_award_commands():
+    counter = bot.CommandCounter()
+    driver = StubDriver()
+    counter.attach(driver)
+    driver.execute("get")
+    with counter.scope() as commands:
+        driver.execute("findElement")
+        driver.execute("findElement")
+        driver.execute("clickElement")
+    assert commands == {"findElement": 2, "clickElement": 1}
+    assert {command: count for command, (count, _) in counter.totals.items()} == {"get": 1, "findElement": 2, "clickElement": 1}
+
+
+@pytest.mark.parametrize("value, commands, over", [(5, 40, False), (5, 41, True), (15, 120, False), (15, 121, True)])
+def test_activity_budget_is_per_submit(value, commands, over):
+    supervisor = make_supervisor({"activity": 40})
+    rule = rule_of_kind("activity")
+    supervisor.check_commands({"фио": "Ученик 1", rule["column"]: value}, rule, {"findElement": commands})
+    assert bool(budget_events(supervisor)) is over
+
+
+def test_column_budget_overrides_kind():
+    rule = rule_of_kind("bonus")
+    supervisor = make_supervisor({"bonus": 40, rule["column"]: 10})
+    supervisor.check_commands({"фио": "Ученик 1", rule["column"]: "да"}, rule, {"findElement": 11})
+    [event] = budget_events(supervisor)
+    assert (event["column"], event["commands"], event["budget"]) == (rule["column"], 11, 10)
+
+
+def test_no_budget_only_samples():
+    rule = rule_of_kind("penalty")
+    supervisor = make_supervisor({})
+    supervisor.check_commands({"фио": "Ученик 1", rule["column"]: 2}, rule, {"findElement": 500})
+    assert budget_events(supervisor) == []
+    assert supervisor.profile.series["commands"][0]["total"] == 500
@@ -0,0 +1,23 @@
+"""Полный запуск с браузером на записанном сайте со сбоями: ни двойных начислений, ни очищенных отметок без начисления.
+
+Нужны Chrome и набор записи, поэтому проверка идет только по запросу:
+FAULT_BUNDLE=recordings/bundle-....json FAULT_SCENARIO=scenario.json python -m pytest tests/test_fault_scenario.py -s
+"""
+
+import json
+import os
+
+import pytest
+
+from tests.harness import run_fault_scenario
+
+BUNDLE = os.environ.get("FAULT_BUNDLE", "")
+SCENARIO = os.environ.get("FAULT_SCENARIO", "")
+
+
+@pytest.mark.skipif(not (BUNDLE and SCENARIO), reason="не заданы FAULT_BUNDLE и FAULT_SCENARIO")
+def test_fault_scenario():
+    report = run_fault_scenario(BUNDLE, SCENARIO)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    assert report["double_awards"] == 0
+    assert report["lost_cells"] == 0
@@ -0,0 +1,43 @@
+"""Запросы к Google Sheets, ячейки, байты и время растут не быстрее линейного с числом учеников."""
+
+import os
+
+import pytest
+
+import bot
+from tests.harness import SCALE_LIMITS, growth_exponent, run_scale_case
+
+# числа учеников через запятую можно задать в SCALE_SIZES, долю заполненных ячеек отметок - в SCALE_DENSITY
+SCALE_SIZES = [int(size) for size in os.environ.get("SCALE_SIZES", "10,100,1000,10000").split(",")]
+DENSITY = float(os.environ.get("SCALE_DENSITY", "0.3"))
+# целиком загружаемый и потоковый листы читаются по-разному, поэтому проверяются отдельно:
+# скачок при переходе к порциям исказил бы степень роста
+MODES = {"whole": {"stream_min_rows": 10**9}, "streamed": {"stream_min_rows": 0}}
+
+
+@pytest.fixture(scope="module", params=MODES)
+def scale_results(request) -> list:
+    bot.import_heavy()
+    settings = {**bot.DEFAULT_SETTINGS, **MODES[request.param]}
+    return [run_scale_case(students, DENSITY, settings) for students in sorted(SCALE_SIZES)]
+
+
+def test_no_quota_errors(scale_results):
+    """Каждому запросу к API предшествует throttle(), поэтому ответов 429 нет."""
+    assert [result["rejected"] for result in scale_results] == [0] * len(scale_results)
+
+
+@pytest.mark.parametrize("metric", SCALE_LIMITS)
+def test_linear_growth(scale_results, metric):
+    # малые листы не показательны по времени, поэтому степень считается по листам от 100 учеников
+    fitted = [result for result in scale_results if result["students"] >= 100] or scale_results
+    exponent = growth_exponent([result["students"] for result in fitted], [result[metric] for result in fitted])
+    assert exponent is not None
+    assert exponent <= SCALE_LIMITS[metric], f"{metric}: степень роста {exponent:.2f}, допустимо до {SCALE_LIMITS[metric]}"
+
+
+def test_streamed_sheet_is_read_once():
+    """Начисления идут по порциям, проверенным validate_stream: потоковый лист читает столько же ячеек, сколько целый."""
+    bot.import_heavy()
+    read = [run_scale_case(1000, DENSITY, {**bot.DEFAULT_SETTINGS, **settings})["cells_read"] for settings in MODES.values()]
+    assert read[0] == read[1]
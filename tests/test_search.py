@@ -0,0 +1,63 @@
+"""Поиск ученика открывает профиль только при точном совпадении ФИО."""
+
+import pytest
+
+import bot
+
+
+class Link:
+    def __init__(self, opened: list, name: str) -> None:
+        self.opened = opened
+        self.name = name
+
+    def click(self) -> None:
+        self.opened.append(self.name)
+
+
+class Row:
+    def __init__(self, opened: list, name: str) -> None:
+        self.link = Link(opened, name)
+
+    def find_element(self, by: str, value: str) -> Link:
+        return self.link
+
+
+class SearchDriver:
+    """Страница пользователей, у которой после поиска видны строки с ФИО names."""
+
+    def __init__(self, names: list) -> None:
+        self.opened: list = []
+        self.rows = [(Row(self.opened, name), name) for name in names]
+
+    def find_element(self, by: str, value: str):
+        return self
+
+    def clear(self) -> None:
+        pass
+
+    def send_keys(self, text: str) -> None:
+        pass
+
+    def execute_script(self, script: str, *args) -> list:
+        return self.rows
+
+
+@pytest.fixture(autouse=True)
+def selenium():
+    bot.import_heavy()
+
+
+@pytest.mark.parametrize(
+    "names, result, opened",
+    [
+        (["Иванов  иван"], bot.StepResult.OK, ["Иванов  иван"]),
+        (["Петров Петр"], bot.StepResult.NOT_FOUND, []),
+        (["Иванов Иван Петрович"], bot.StepResult.AMBIGUOUS, []),
+        (["Иванов Иван", "Иванов Иван"], bot.StepResult.AMBIGUOUS, []),
+        ([], bot.StepResult.NOT_FOUND, []),
+    ],
+)
+def test_single_row_must_match(names, result, opened):
+    driver = SearchDriver(names)
+    assert bot.find_and_open_user(driver, "Иванов Иван") is result
+    assert driver.opened == opened
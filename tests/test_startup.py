@@ -0,0 +1,41 @@
+"""Окно появляется быстро и до загрузки selenium и gspread."""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from tests.conftest import ROOT
+
+# Окно должно появиться не позже, чем через столько секунд от начала работы скрипта
+STARTUP_WINDOW_SECONDS = 1.0
+
+STARTUP_SCRIPT = """
+import json, sys
+import bot
+window = sys.argv[1] == "window"
+if window:
+    from tkinter import Tk
+    root = Tk()
+    root.update()
+bot.mark_window_ready()
+print(json.dumps({"window": bot.startup_timings["окно"][1], "eager": bot.eager_imports}))
+"""
+
+
+def measure_startup(mode: str) -> dict:
+    """Запускает бота в отдельном процессе, чтобы замер начинался с пустого sys.modules."""
+    completed = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, mode], cwd=ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        if mode == "window" and "TclError" in completed.stderr:
+            pytest.skip("нет экрана для окна")
+        raise AssertionError(completed.stderr)
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize("mode", ["import", "window"])
+def test_window_before_heavy_imports(mode):
+    startup = measure_startup(mode)
+    assert startup["eager"] == [], f"до появления окна загружены: {', '.join(startup['eager'])}"
+    assert startup["window"] <= STARTUP_WINDOW_SECONDS, f"окно появилось через {startup['window']:.2f} с"
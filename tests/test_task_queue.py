@@ -0,0 +1,70 @@
+"""Общая очередь: результаты столбцов сохраняются в задаче, повторная аренда не начисляет их снова."""
+
+import threading
+
+import pytest
+
+import bot
+from tests.harness import StubSupervisor
+
+
+@pytest.fixture(params=["local", "coordinator"])
+def task_queue(request, tmp_path):
+    if request.param == "local":
+        yield bot.TaskQueue(str(tmp_path / "queue.sqlite"))
+        return
+    server = bot.make_coordinator(str(tmp_path / "queue.sqlite"), token="secret")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield bot.open_task_queue(f"http://127.0.0.1:{server.server_port}/", "secret")
+    server.shutdown()
+    server.server_close()
+
+
+def publish_one(task_queue, marks: dict) -> str:
+    return task_queue.publish("login", [{"index": 0, "student": "Иванов Иван", "marks": marks}])
+
+
+def test_claimed_column_is_not_claimed_again(task_queue):
+    publish_one(task_queue, {"бонус пропуск": "1"})
+    task = task_queue.lease("first", "login", 60, 3)
+    assert task_queue.claim(task["id"], "first", "бонус пропуск", 60)
+    assert not task_queue.claim(task["id"], "first", "бонус пропуск", 60)
+    assert not task_queue.claim(task["id"], "second", "бонус пропуск", 60)
+
+
+def test_expired_lease_keeps_recorded_columns(task_queue, monkeypatch):
+    marks = {"бонус пропуск": "1", "бонус поведение": "1", "конкурсы-активность": "1"}
+    run = publish_one(task_queue, marks)
+    task = task_queue.lease("first", "login", 0, 3)
+    task_queue.claim(task["id"], "first", "бонус пропуск", 0)
+    task_queue.record(task["id"], "first", "бонус пропуск", bot.StepResult.OK.value, 0)
+    # первый рабочий завис посреди начисления второго столбца
+    task_queue.claim(task["id"], "first", "бонус поведение", 0)
+
+    applied = []
+    monkeypatch.setattr(bot, "apply_rule", lambda supervisor, driver, row, rule: applied.append(rule["column"]) or bot.StepResult.OK)
+    breaker = bot.FailureBreaker(bot.DEFAULT_SETTINGS)
+    task = task_queue.lease("second", "login", 60, 3)
+    assert task["results"] == {"бонус пропуск": "ok", "бонус поведение": bot.TaskQueue.STARTED}
+    bot.execute_task(StubSupervisor(), breaker, task_queue, task, "second", 60)
+
+    assert applied == ["конкурсы-активность"]
+    assert breaker.unconfirmed == ["Иванов Иван"]
+    [done] = task_queue.collect(run)
+    assert done["results"] == {"бонус пропуск": "ok", "бонус поведение": bot.TaskQueue.STARTED, "конкурсы-активность": "ok"}
+
+
+def test_coordinator_rejects_wrong_token(tmp_path):
+    server = bot.make_coordinator(str(tmp_path / "queue.sqlite"), token="secret")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with pytest.raises(OSError):
+            bot.open_task_queue(f"http://127.0.0.1:{server.server_port}/", "wrong").remaining("run")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_unc_queue_path_is_rejected():
+    with pytest.raises(ValueError):
+        bot.TaskQueue("//server/share/queue.sqlite")
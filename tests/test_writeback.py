@@ -0,0 +1,58 @@
+"""Подтвержденные начисления очищаются в листе, даже если обработка прервалась ошибкой."""
+
+import pytest
+
+import bot
+from tests.harness import StubSupervisor
+
+MARKS = {"бонус пропуск": "да", "бонус поведение": "да"}
+
+
+def one_student_table() -> bot.SheetTable:
+    columns = [rule["column"] for rule in bot.AWARD_RULES]
+    return bot.SheetTable(["фио", *columns], [["Иванов Иван", *(MARKS.get(column, "") for column in columns)]])
+
+
+def fail_after_first(cleared_rules: list):
+    """apply_rule, который подтверждает первое начисление и падает на втором."""
+
+    def apply_rule(supervisor, driver, row, rule, confirm=None):
+        if cleared_rules:
+            raise RuntimeError("браузер упал")
+        cleared_rules.append(rule["column"])
+        return bot.StepResult.OK
+
+    return apply_rule
+
+
+def test_process_rows_flushes_confirmed_awards_on_error(monkeypatch):
+    applied: list = []
+    monkeypatch.setattr(bot, "apply_rule", fail_after_first(applied))
+    table = one_student_table()
+    written: list = []
+    with pytest.raises(RuntimeError):
+        bot.process_rows(table, StubSupervisor(), bot.FailureBreaker(bot.DEFAULT_SETTINGS), written.extend)
+    assert written == [(0, applied[0])]
+
+
+class OneTableSheet:
+    """Лист для режима наблюдения: всегда отдает одну и ту же таблицу и запоминает очищенные ячейки."""
+
+    def __init__(self, table: bot.SheetTable) -> None:
+        self.table = table
+        self.cleared: list = []
+
+    def load_data_from_google_sheet(self) -> bot.SheetTable:
+        return self.table
+
+    def clear_cells(self, table, cells: list) -> None:
+        self.cleared += cells
+
+
+def test_watch_sheet_flushes_confirmed_awards_on_error(monkeypatch):
+    applied: list = []
+    monkeypatch.setattr(bot, "apply_rule", fail_after_first(applied))
+    sheet = OneTableSheet(one_student_table())
+    with pytest.raises(RuntimeError):
+        bot.watch_sheet(sheet, StubSupervisor(), 0)
+    assert sheet.cleared == [(0, applied[0])]